@@ -0,0 +1,253 @@
+"""Benchmark astmgr's magics against the jira/gitlab stand-in
+
+Each case is timed over a few runs (best wall time is reported), then
+run once more under tracemalloc for its peak memory. Requests and bytes
+are those the stand-in served during the last timed run.
+
+Usage:
+    bench.py [options] [<case>...]
+
+Options:
+    --latency=<ms>  Added to every stand-in response [default: 20]
+    --issues=<n>  Issues the searches page through [default: 500]
+    --boards=<n>  Agile boards [default: 10]
+    --sprints=<n>  Sprints per board [default: 20]
+    --page-size=<n>  Page size of searches and the stand-in [default: 100]
+    --repeat=<n>  Timed runs per case [default: 3]
+    --save=<file>  Write the results as json, eg: a new baseline
+    --baseline=<file>  Compare with saved results
+    --tolerance=<ratio>  Slowdown over the baseline that fails [default: 1.25]
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from standin import PROJECT, StandIn
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def write_config(directory, url, page_size=100):
+    """An astmgr.yaml pointing jira and gitlab at the stand-in"""
+    import yaml
+
+    config = {
+        "jira": {
+            "api": {"server": url, "username": "bench", "password": "bench"},
+            "sprint_workers": 8,
+            "batch_workers": 8,
+            "issue_cache_ttl": 60,
+            "rate_limit": {"rate": 1000, "burst": 1000},
+            # cached pages would hide the paging the search case measures
+            "search": {
+                "page_size": page_size,
+                "limit": 50,
+                "workers": 4,
+                "cache_ttl": 0,
+            },
+            "prefetch": {"count": 0},
+            "transitions": {"open": "Open"},
+            "users": {"bench": "bench-user"},
+            "field_map": {
+                "key": "key",
+                "summary": "fields.summary",
+                "description": "fields.description",
+                "reporter": "fields.reporter.displayName",
+                "assignee": "fields.assignee.displayName",
+                "status": "fields.status.name",
+                "labels": "fields.labels",
+                "project": "fields.project.key",
+                "issuetype": "fields.issuetype.name",
+            },
+        },
+        "gitlab": {
+            "testing_pipeline_project": 1,
+            "rate_limit": {"rate": 1000, "burst": 1000},
+            "api": {"url": url, "personal_access_token": "bench"},
+        },
+        "cache": {"dir": os.path.join(directory, "cache")},
+        "index": {"projects": []},
+        "transport": {"pool_size": 20, "timeout": 30, "retries": 0},
+    }
+    path = os.path.join(directory, "astmgr.yaml")
+    with open(path, "w") as fp:
+        yaml.safe_dump(config, fp)
+    return path
+
+
+class Bench:
+    def __init__(self, standin, magics):
+        self.standin = standin
+        self.magics = magics
+        self.issues = None
+
+    def startup(self):
+        # a fresh interpreter, the import is what a user waits on
+        subprocess.run(
+            [sys.executable, "-c", "import astmgr.shell"],
+            env=dict(os.environ, PYTHONPATH=SRC),
+            check=True,
+        )
+
+    def load_sprints(self):
+        self.magics.load_sprints("--force")
+
+    def search(self):
+        self.magics.search(
+            "project = %s --limit %s" % (PROJECT, self.standin.issues)
+        )
+
+    def pprint_setup(self):
+        if self.issues is None:
+            self.issues = self.magics.jira.search_issues(
+                "project = %s" % PROJECT, maxResults=100
+            )
+
+    def pprint(self):
+        from astmgr.render import YamlRenderer
+
+        self.magics.pprint(
+            *self.issues,
+            out=YamlRenderer(stream=io.StringIO(), highlight=True),
+        )
+
+    def run_regression(self):
+        self.magics.run_regression("1.0.0 1.1.0")
+
+
+CASES = ["startup", "load_sprints", "search", "pprint", "run_regression"]
+
+
+def measure(bench, case, repeat):
+    run = getattr(bench, case)
+    setup = getattr(bench, case + "_setup", None)
+    walls = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        bench.standin.reset()
+        start = time.perf_counter()
+        run()
+        walls.append(time.perf_counter() - start)
+    requests, nbytes = bench.standin.requests(), bench.standin.bytes
+    for route in bench.standin.counts:
+        if route.startswith("unrouted"):
+            print("%s: %s" % (case, route), file=sys.stderr)
+    if setup:
+        setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "wall": round(min(walls), 4),
+        "requests": requests,
+        "bytes": nbytes,
+        "peak_kb": peak // 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Rows of the comparison, and whether any case regressed"""
+    rows = []
+    failed = False
+    for case, result in results.items():
+        base = baseline.get(case)
+        if not base:
+            rows.append([case, result["wall"], "", result["requests"], ""])
+            continue
+        ratio = result["wall"] / base["wall"] if base["wall"] else 1
+        regressed = ratio > tolerance or result["requests"] > base["requests"]
+        failed = failed or regressed
+        rows.append(
+            [
+                case,
+                result["wall"],
+                "%.2fx" % ratio,
+                result["requests"],
+                base["requests"],
+                "REGRESSED" if regressed else "",
+            ]
+        )
+    return rows, failed
+
+
+def main(argv=None):
+    from docopt import docopt
+
+    args = docopt(__doc__, argv=argv)
+    cases = args["<case>"] or CASES
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        print("unknown cases %s, pick from %s" % (unknown, ", ".join(CASES)))
+        return 2
+    logging.basicConfig(level=logging.WARNING)
+    standin = StandIn(
+        issues=int(args["--issues"]),
+        boards=int(args["--boards"]),
+        sprints=int(args["--sprints"]),
+        latency=float(args["--latency"]) / 1000,
+        page_size=int(args["--page-size"]),
+    )
+    url = standin.start()
+    directory = tempfile.mkdtemp(prefix="astmgr-bench-")
+    os.environ["ASTMGR_CONFIG"] = write_config(
+        directory, url, int(args["--page-size"])
+    )
+    sys.path.insert(0, SRC)
+    from astmgr.magics import JiraMagics
+    from tabulate import tabulate
+
+    magics = JiraMagics(None)
+    # the background client and sprint loads must not count against a case
+    magics.sprint_registry
+    bench = Bench(standin, magics)
+    results = {}
+    for case in cases:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[case] = measure(bench, case, int(args["--repeat"]))
+        print(
+            "%-16s %8.3fs %6s requests %10s bytes %8s KB peak"
+            % (
+                case,
+                results[case]["wall"],
+                results[case]["requests"],
+                results[case]["bytes"],
+                results[case]["peak_kb"],
+            )
+        )
+    standin.stop()
+    if args["--save"]:
+        with open(args["--save"], "w") as fp:
+            json.dump(results, fp, indent=2)
+    if args["--baseline"]:
+        with open(args["--baseline"]) as fp:
+            baseline = json.load(fp)
+        rows, failed = compare(results, baseline, float(args["--tolerance"]))
+        print(
+            tabulate(
+                rows,
+                headers=[
+                    "case",
+                    "wall",
+                    "vs baseline",
+                    "requests",
+                    "baseline",
+                    "",
+                ],
+            )
+        )
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
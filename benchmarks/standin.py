@@ -0,0 +1,489 @@
+"""A local stand-in for the jira and gitlab apis astmgr talks to
+
+Responses are generated from a few counts, shaped like recorded jira
+server and gitlab responses, and any recorded response in a replay file
+overrides the generated one for its exact method and path.
+
+Usage:
+    standin.py [options]
+
+Options:
+    --port=<port>  Port to listen on [default: 8080]
+    --latency=<ms>  Added to every response [default: 0]
+    --issues=<n>  Issues search pages through [default: 500]
+    --boards=<n>  Agile boards [default: 10]
+    --sprints=<n>  Sprints per board [default: 20]
+    --page-size=<n>  Most issues a search page returns [default: 100]
+    --replay=<file>  json list of recorded {method, path, body} responses
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROJECT = "BENCH"
+JIRA_API = r"/rest/api/(?:2|3|latest)"
+AGILE_API = r"/rest/agile/1\.0"
+GITLAB_API = r"/api/v4/projects/(?P<project>[^/]+)"
+KEY_LIST = re.compile(r"\bkey\s+in\s*\(([^)]*)\)", re.I)
+
+
+class Response:
+    "A handler result with its own status and headers eg: a throttle"
+
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+class StandIn:
+    """Generated jira and gitlab data plus a threaded http server for it
+
+    latency is added to every response, page_size caps maxResults like
+    jira does and counts holds requests per "METHOD route". The throttled
+    routes always answer 429 with a Retry-After of retry_after seconds.
+    time_zone is the user's profile zone jira reads jql dates in.
+    """
+
+    def __init__(
+        self,
+        issues=500,
+        boards=10,
+        sprints=20,
+        comments=5,
+        versions=4,
+        latency=0.0,
+        page_size=100,
+        replay=None,
+        retry_after=0.01,
+        time_zone="Australia/Sydney",
+    ):
+        self.issues = issues
+        self.boards = boards
+        self.sprints = sprints
+        self.comments = comments
+        self.versions = versions
+        self.latency = latency
+        self.page_size = page_size
+        self.retry_after = retry_after
+        self.time_zone = time_zone
+        self.recorded = {}
+        if replay:
+            with open(replay) as fp:
+                for response in json.load(fp):
+                    self.recorded[(response["method"], response["path"])] = (
+                        response["body"]
+                    )
+        self.counts = Counter()
+        self.bytes = 0
+        self.schedules = {}
+        self.created_sprints = {}
+        # issue key -> sprint id, for issues moved with add_issues_to_sprint
+        self.moved = {}
+        # moves of these issue keys fail
+        self.failing = set()
+        # keys of deleted issues, searches skip them and refuse to name them
+        self.deleted = set()
+        self.lock = threading.Lock()
+        self.server = None
+        self.routes = [
+            ("GET", JIRA_API + r"/serverInfo$", self.server_info),
+            ("GET", JIRA_API + r"/field$", lambda m, q, b: []),
+            ("GET", JIRA_API + r"/myself$", self.myself),
+            ("GET", JIRA_API + r"/throttled$", self.throttled),
+            ("GET", JIRA_API + r"/search$", self.search),
+            ("POST", JIRA_API + r"/search$", self.search),
+            ("GET", JIRA_API + r"/issue/(?P<key>[^/]+)$", self.issue),
+            (
+                "GET",
+                JIRA_API + r"/issue/(?P<key>[^/]+)/comment$",
+                self.issue_comments,
+            ),
+            (
+                "GET",
+                JIRA_API + r"/project/(?P<project>[^/]+)/versions$",
+                self.project_versions,
+            ),
+            ("GET", AGILE_API + r"/board$", self.board_list),
+            (
+                "GET",
+                AGILE_API + r"/board/(?P<board>\d+)/sprint$",
+                self.board_sprints,
+            ),
+            ("POST", AGILE_API + r"/sprint$", self.sprint_create),
+            (
+                "PUT",
+                AGILE_API + r"/sprint/(?P<sprint>\d+)$",
+                self.sprint_update,
+            ),
+            (
+                "POST",
+                AGILE_API + r"/sprint/(?P<sprint>\d+)/issue$",
+                self.sprint_move,
+            ),
+            ("GET", GITLAB_API + r"/throttled$", self.throttled),
+            (
+                "GET",
+                GITLAB_API + r"/pipeline_schedules$",
+                self.schedule_list,
+            ),
+            (
+                "POST",
+                GITLAB_API + r"/pipeline_schedules$",
+                self.schedule_create,
+            ),
+            (
+                "GET",
+                GITLAB_API + r"/pipeline_schedules/(?P<schedule>\d+)$",
+                self.schedule_get,
+            ),
+            (
+                "POST",
+                GITLAB_API
+                + r"/pipeline_schedules/(?P<schedule>\d+)/variables$",
+                self.variable_create,
+            ),
+            (
+                "PUT",
+                GITLAB_API
+                + r"/pipeline_schedules/(?P<schedule>\d+)/variables/"
+                r"(?P<key>[^/]+)$",
+                self.variable_update,
+            ),
+        ]
+        self.routes = [
+            (method, re.compile(pattern), handler)
+            for method, pattern, handler in self.routes
+        ]
+
+    def throttled(self, match, query, body):
+        return Response(
+            429,
+            {"message": "rate limit exceeded"},
+            {"Retry-After": str(self.retry_after)},
+        )
+
+    # jira
+
+    def server_info(self, match, query, body):
+        return {
+            "baseUrl": self.url,
+            "version": "9.4.0",
+            "versionNumbers": [9, 4, 0],
+            "deploymentType": "Server",
+            "serverTitle": "stand-in",
+            "serverTime": datetime.now(timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%S.%f"
+            )[:-3]
+            + "+0000",
+        }
+
+    def myself(self, match, query, body):
+        return {
+            "accountId": "bench-user",
+            "name": "bench",
+            "active": True,
+            "timeZone": self.time_zone,
+        }
+
+    def _version(self, number):
+        return {
+            "id": str(number + 1),
+            "name": "1.%s.0" % number,
+            "released": False,
+            "startDate": "2024-%02d-01" % (number % 12 + 1),
+            "userStartDate": "01/%02d/24" % (number % 12 + 1),
+        }
+
+    def _issue(self, number):
+        return {
+            "id": str(10000 + number),
+            "key": "%s-%s" % (PROJECT, number),
+            "self": "%s/rest/api/2/issue/%s" % (self.url, 10000 + number),
+            "fields": {
+                "summary": "Issue number %s of the stand-in" % number,
+                "description": "A description\n" * 20,
+                "status": {
+                    "name": ("Open", "In Progress", "Done")[number % 3]
+                },
+                "assignee": {
+                    "accountId": "user-%s" % (number % 7),
+                    "displayName": "User %s" % (number % 7),
+                },
+                "reporter": {"accountId": "bench", "displayName": "Bench"},
+                "labels": ["bench"] if number % 2 else [],
+                "project": {"key": PROJECT},
+                "issuetype": {"name": "Task"},
+                "fixVersions": [self._version(number % self.versions)],
+                "customfield_10020": [
+                    {
+                        "id": number % self.sprints + 1,
+                        "name": "Sprint %s" % (number % self.sprints + 1),
+                        "state": "active",
+                    }
+                ],
+                "created": "2024-01-01T00:00:00.000+0000",
+                "updated": "2024-02-01T00:00:00.000+0000",
+            },
+        }
+
+    def search(self, match, query, body):
+        params = dict(query, **(body or {}))
+        # jira refuses a whole query naming an issue that doesn't exist
+        named = KEY_LIST.findall(params.get("jql", ""))
+        unknown = [
+            key
+            for keys in named
+            for key in re.split(r"\s*,\s*", keys.strip())
+            if key in self.deleted
+        ]
+        if unknown:
+            return Response(
+                400,
+                {
+                    "errorMessages": [
+                        "An issue with key '%s' does not exist for field "
+                        "'key'." % key
+                        for key in unknown
+                    ],
+                    "errors": {},
+                },
+            )
+        numbers = [
+            number
+            for number in range(self.issues)
+            if "%s-%s" % (PROJECT, number) not in self.deleted
+        ]
+        start = int(params.get("startAt", 0))
+        size = min(int(params.get("maxResults", 50)), self.page_size)
+        return {
+            "startAt": start,
+            "maxResults": size,
+            "total": len(numbers),
+            "issues": [
+                self._issue(number) for number in numbers[start : start + size]
+            ],
+        }
+
+    def issue(self, match, query, body):
+        if match.group("key") in self.deleted:
+            return None
+        return self._issue(int(match.group("key").rsplit("-", 1)[1]))
+
+    def issue_comments(self, match, query, body):
+        comments = [
+            {
+                "id": str(number),
+                "author": {"displayName": "User %s" % number},
+                "body": "Comment %s\n" % number * 5,
+                "created": "2024-01-01T00:00:00.000+0000",
+                "updated": "2024-01-01T00:00:00.000+0000",
+            }
+            for number in range(self.comments)
+        ]
+        return {
+            "startAt": 0,
+            "maxResults": len(comments),
+            "total": len(comments),
+            "comments": comments,
+        }
+
+    def project_versions(self, match, query, body):
+        return [self._version(number) for number in range(self.versions)]
+
+    def _agile_page(self, values, query):
+        start = int(query.get("startAt", 0))
+        size = min(int(query.get("maxResults", 50)), self.page_size)
+        page = values[start : start + size]
+        return {
+            "startAt": start,
+            "maxResults": size,
+            "total": len(values),
+            "isLast": start + size >= len(values),
+            "values": page,
+        }
+
+    def board_list(self, match, query, body):
+        boards = [
+            {"id": board, "name": "Board %s" % board, "type": "scrum"}
+            for board in range(1, self.boards + 1)
+        ]
+        return self._agile_page(boards, query)
+
+    def board_sprints(self, match, query, body):
+        board = int(match.group("board"))
+        sprints = [
+            {
+                "id": board * 1000 + sprint,
+                "name": "Board %s Sprint %s" % (board, sprint),
+                "state": "active" if sprint == self.sprints else "closed",
+                "originBoardId": board,
+            }
+            for sprint in range(1, self.sprints + 1)
+        ]
+        return self._agile_page(sprints, query)
+
+    def sprint_create(self, match, query, body):
+        with self.lock:
+            sprint = dict(
+                body, id=90000 + len(self.created_sprints), state="future"
+            )
+            self.created_sprints[sprint["id"]] = sprint
+            return sprint
+
+    def sprint_update(self, match, query, body):
+        return dict(body, id=int(match.group("sprint")))
+
+    def sprint_move(self, match, query, body):
+        if self.failing.intersection(body["issues"]):
+            return Response(500, {"errorMessages": ["move failed"]})
+        with self.lock:
+            for key in body["issues"]:
+                self.moved[key] = int(match.group("sprint"))
+        return {}
+
+    # gitlab
+
+    def schedule_list(self, match, query, body):
+        with self.lock:
+            return list(self.schedules.values())
+
+    def schedule_create(self, match, query, body):
+        with self.lock:
+            schedule = dict(
+                body, id=len(self.schedules) + 1, active=True, variables=[]
+            )
+            self.schedules[schedule["id"]] = schedule
+            return schedule
+
+    def schedule_get(self, match, query, body):
+        with self.lock:
+            return self.schedules.get(int(match.group("schedule")))
+
+    def variable_create(self, match, query, body):
+        with self.lock:
+            schedule = self.schedules[int(match.group("schedule"))]
+            variable = dict(body, variable_type="env_var")
+            schedule["variables"].append(variable)
+            return variable
+
+    def variable_update(self, match, query, body):
+        with self.lock:
+            schedule = self.schedules[int(match.group("schedule"))]
+            for variable in schedule["variables"]:
+                if variable["key"] == match.group("key"):
+                    variable.update(body)
+                    return variable
+        return None
+
+    # http
+
+    def respond(self, method, path, query, body):
+        """(status, body, headers) for a request, counted under its route"""
+        if self.latency:
+            time.sleep(self.latency)
+        if (method, path) in self.recorded:
+            with self.lock:
+                self.counts["%s %s" % (method, path)] += 1
+            return 200, self.recorded[(method, path)], {}
+        for route_method, pattern, handler in self.routes:
+            match = pattern.search(path)
+            if route_method == method and match:
+                with self.lock:
+                    self.counts["%s %s" % (method, pattern.pattern)] += 1
+                result = handler(match, query, body)
+                if isinstance(result, Response):
+                    return result.status, result.body, result.headers
+                if result is None:
+                    return 404, {"message": "not found"}, {}
+                return 201 if method == "POST" else 200, result, {}
+        with self.lock:
+            self.counts["unrouted %s %s" % (method, path)] += 1
+        return 404, {"message": "no stand-in route for %s" % path}, {}
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.bytes = 0
+
+    def requests(self):
+        with self.lock:
+            return sum(self.counts.values())
+
+    def start(self, port=0):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                url = urlparse(self.path)
+                query = {
+                    name: values[-1]
+                    for name, values in parse_qs(url.query).items()
+                }
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or "null")
+                status, result, headers = standin.respond(
+                    self.command, url.path, query, body
+                )
+                data = json.dumps(result).encode()
+                with standin.lock:
+                    standin.bytes += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    from docopt import docopt
+
+    args = docopt(__doc__, argv=argv)
+    standin = StandIn(
+        issues=int(args["--issues"]),
+        boards=int(args["--boards"]),
+        sprints=int(args["--sprints"]),
+        latency=float(args["--latency"]) / 1000,
+        page_size=int(args["--page-size"]),
+        replay=args["--replay"],
+    )
+    print("stand-in on %s" % standin.start(int(args["--port"])))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
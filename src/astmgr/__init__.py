@@ -1,3 +1,8 @@
 from astmgr.utils import get_config
 
-CONFIG = get_config()
+
+def __getattr__(name):
+    # CONFIG is read on first use, importing astmgr must stay cheap
+    if name == "CONFIG":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
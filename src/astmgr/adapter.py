@@ -0,0 +1,38 @@
+import time
+
+from requests.adapters import HTTPAdapter
+
+from astmgr import stats
+
+
+class ScheduledAdapter(HTTPAdapter):
+    "HTTPAdapter that sends through a RequestScheduler and retries throttles"
+
+    def __init__(self, scheduler, *args, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.scheduler.acquire()
+            start = time.perf_counter()
+            response = super().send(request, **kwargs)
+            stats.observe(
+                self.scheduler.name,
+                response,
+                time.perf_counter() - start,
+                stream=kwargs.get("stream", False),
+            )
+            self.scheduler.observe(response)
+            if not self.scheduler.throttled(response):
+                return response
+            self.scheduler.count("throttled")
+            if attempt >= self.scheduler.retries:
+                self.scheduler.count("gave_up")
+                return response
+            delay = self.scheduler.delay(attempt, response)
+            response.close()
+            self.scheduler.count("retried")
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from astmgr.stats import carry
+
+
+def run_batch(function, keys, workers=8):
+    """Call function(key) for each key on a bounded pool
+
+    Returns (key, ok, result or exception) tuples in the order of keys,
+    one failing issue never stops the others.
+    """
+
+    def call(key):
+        try:
+            return key, True, function(key)
+        except Exception as e:
+            return key, False, e
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(keys)))
+    ) as pool:
+        return list(pool.map(carry(call), keys))
+
+
+def print_batch(results):
+    from tabulate import tabulate
+
+    print(
+        tabulate(
+            [
+                [key, "ok" if ok else "FAILED", result]
+                for key, ok, result in results
+            ],
+            tablefmt="plain",
+        )
+    )
+    failed = sum(1 for _, ok, _ in results if not ok)
+    print("%s ok, %s failed" % (len(results) - failed, failed))
@@ -0,0 +1,111 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ORDER_BY = re.compile(r"\border\s+by\b", re.I)
+# the sort of queries whose default order normalize_jql strips, or that
+# have none, jira then sorts by its own default
+DEFAULT_SORT = "updated DESC, created DESC"
+
+
+class TTLCache:
+    """A small thread safe LRU mapping whose entries expire after ttl seconds
+
+    With maxbytes, least recently used entries are also evicted once the
+    sizes sizeof(value) reports add up to more than maxbytes.
+    """
+
+    def __init__(self, ttl, maxsize=128, maxbytes=None, sizeof=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, key):
+        _, _, size = self._data.pop(key)
+        self.nbytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            stored, value, _ = entry
+            if time.monotonic() - stored > self.ttl:
+                self._evict(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.maxbytes and self.sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+            if self.maxbytes and size > self.maxbytes:
+                # would evict everything else, don't cache it at all
+                return
+            self._data[key] = (time.monotonic(), value, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (
+                self.maxbytes and self.nbytes > self.maxbytes
+            ):
+                self._evict(next(iter(self._data)))
+
+    def pop(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            value = self._data[key][1]
+            self._evict(key)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class QueryCache(TTLCache):
+    """Search result pages keyed by (normalized jql, ...) tuples
+
+    invalidate() drops the pages a write could have changed: those listing
+    a changed issue, whose query filters or sorts on a changed field or,
+    for a created issue, whose query could match its project.
+    """
+
+    def invalidate(self, keys=(), fields=(), project=None):
+        keys = {key.upper() for key in keys}
+        mentions = fields and re.compile(
+            r"\b(?:%s)\b" % "|".join(map(re.escape, fields)), re.I
+        )
+        with self._lock:
+            for cache_key, (_, page, _) in list(self._data.items()):
+                # a write moves issues between pages sorted by what it
+                # changed, not only the pages that list them
+                where, *order = ORDER_BY.split(cache_key[0], 1)
+                order = order[0] if order else DEFAULT_SORT
+                if (
+                    any(issue.key.upper() in keys for issue in page)
+                    or (
+                        mentions
+                        and (mentions.search(where) or mentions.search(order))
+                    )
+                    or (
+                        project
+                        and (
+                            not re.search(r"\bproject\b", where, re.I)
+                            or re.search(
+                                r"\b%s\b" % re.escape(project), where, re.I
+                            )
+                        )
+                    )
+                ):
+                    self._evict(cache_key)
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from astmgr.cache import QueryCache
+
+
+def _cache(*queries):
+    cache = QueryCache(60)
+    for jql, keys in queries:
+        cache.set((jql, (), 0, 50), [SimpleNamespace(key=key) for key in keys])
+    return cache
+
+
+def _left(cache):
+    return sorted(key[0] for key in cache._data)
+
+
+def test_invalidate_drops_pages_listing_a_changed_issue():
+    cache = _cache(("a = 1", ["A-1"]), ("a = 2", ["A-2"]))
+    cache.invalidate(["a-1"])
+    assert _left(cache) == ["a = 2"]
+
+
+def test_invalidate_drops_pages_filtering_on_a_changed_field():
+    cache = _cache(
+        ("assignee = x ORDER BY key", ["A-1"]),
+        ("labels = y ORDER BY key", ["A-2"]),
+    )
+    cache.invalidate(["B-1"], ["assignee"])
+    assert _left(cache) == ["labels = y ORDER BY key"]
+
+
+def test_invalidate_drops_pages_sorted_on_a_changed_field():
+    cache = _cache(
+        ("project = A ORDER BY status", ["A-1"]),
+        ("project = A ORDER BY key", ["A-2"]),
+    )
+    cache.invalidate(["B-1"], ["status"])
+    assert _left(cache) == ["project = A ORDER BY key"]
+
+
+def test_invalidate_treats_the_stripped_default_order_as_updated():
+    # normalize_jql strips ORDER BY updated DESC, created DESC
+    cache = _cache(("project = A", ["A-1"]), ("project = A ORDER BY key", []))
+    cache.invalidate(["B-1"], ["updated", "labels"])
+    assert _left(cache) == ["project = A ORDER BY key"]
+
+
+def test_invalidate_drops_pages_a_created_issue_could_join():
+    cache = _cache(
+        ("project = A ORDER BY key", []),
+        ("project = B ORDER BY key", []),
+        ("labels = x ORDER BY key", []),
+    )
+    cache.invalidate(project="A")
+    assert _left(cache) == ["project = B ORDER BY key"]
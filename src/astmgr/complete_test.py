@@ -0,0 +1,42 @@
+import shlex
+from types import SimpleNamespace
+
+import pytest
+
+
+def _complete(magics, line, symbol):
+    """The completed lines, the way ipython applies the completions"""
+    event = SimpleNamespace(command=line.split()[0], line=line, symbol=symbol)
+    completions = magics._complete(None, event)
+    # ipython keeps only those starting with the symbol typed
+    assert all(completion.startswith(symbol) for completion in completions)
+    start = len(line) - len(symbol)
+    return [
+        shlex.split(line[:start] + completion)[-1]
+        for completion in completions
+    ]
+
+
+@pytest.mark.parametrize(
+    "line, symbol",
+    [
+        ("%add_to_sprint Boa", "Boa"),
+        ('%add_to_sprint "Boa', "Boa"),
+        ("%add_to_sprint Board", "Board"),
+    ],
+)
+def test_complete_sprint_names_with_spaces(magics, line, symbol):
+    assert _complete(magics, line, symbol) == [
+        "Board %s Sprint %s" % (board, sprint)
+        for board in (1, 2)
+        for sprint in (1, 2, 3)
+    ]
+
+
+def test_complete_inside_a_quoted_sprint_name(magics):
+    assert _complete(magics, '%add_to_sprint "Board 2 Sprint ', "") == [
+        "Board 2 Sprint %s" % sprint for sprint in (1, 2, 3)
+    ]
+    assert _complete(magics, '%add_to_sprint "Board 2 Sp', "Sp") == [
+        "Board 2 Sprint %s" % sprint for sprint in (1, 2, 3)
+    ]
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks")
+sys.path.insert(0, os.path.abspath(BENCHMARKS))
+
+
+@pytest.fixture
+def standin():
+    from standin import StandIn
+
+    standin = StandIn(issues=120, boards=2, sprints=3)
+    standin.start()
+    yield standin
+    standin.stop()
+
+
+@pytest.fixture
+def config(standin, tmp_path):
+    """A config pointing jira and gitlab at the stand-in, caching in tmp"""
+    import yaml
+    from bench import write_config
+    from box import Box
+
+    with open(write_config(str(tmp_path), standin.url)) as fp:
+        return Box(yaml.safe_load(fp))
+
+
+@pytest.fixture
+def magics(config):
+    """JiraMagics on the stand-in, its background threads done on teardown"""
+    from astmgr.magics import JiraMagics
+
+    magics = JiraMagics(None, None, config)
+    magics.sprint_registry
+    yield magics
+    magics.close()
@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from astmgr.search import SearchPages, jql_since, server_now
+from astmgr.utils import cache_path
+
+# issue fields the index needs on top of the field map
+INDEX_FIELDS = [
+    "summary",
+    "project",
+    "issuetype",
+    "status",
+    "assignee",
+    "reporter",
+    "labels",
+    "fixVersions",
+    "customfield_10020",
+    "created",
+    "updated",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY,
+    project TEXT,
+    issuetype TEXT,
+    status TEXT,
+    assignee_id TEXT,
+    reporter_id TEXT,
+    summary TEXT,
+    labels TEXT,
+    fix_versions TEXT,
+    sprints TEXT,
+    created TEXT,
+    updated TEXT,
+    record TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_updated ON issues (updated);
+CREATE INDEX IF NOT EXISTS issues_project ON issues (project);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+# jql field -> column, compared as plain values
+COLUMNS = {
+    "key": "key",
+    "issuekey": "key",
+    "project": "project",
+    "issuetype": "issuetype",
+    "type": "issuetype",
+    "status": "status",
+    "assignee": "assignee_id",
+    "reporter": "reporter_id",
+    "summary": "summary",
+    "text": "summary",
+}
+# jql field -> column holding a |a|b| list, compared by membership
+LIST_COLUMNS = {
+    "fixversion": "fix_versions",
+    "sprint": "sprints",
+    "labels": "labels",
+}
+# lastViewed is not known locally, updated is the closest we have
+ORDER_COLUMNS = {
+    "updated": "updated",
+    "created": "created",
+    "key": "key",
+    "status": "status",
+    "lastviewed": "updated",
+}
+TOKEN = re.compile(
+    r"""\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)'|(!=|!~|=|~|\(|\)|,)"""
+    r"""|([^\s(),="'!~]+))"""
+)
+
+
+class LocalQueryError(ValueError):
+    "The jql uses something the local index can't answer"
+
+
+def _members(values):
+    return "|%s|" % "|".join(str(value) for value in values if value)
+
+
+def _tokenize(jql):
+    tokens = []
+    for match in TOKEN.finditer(jql.strip()):
+        dquoted, squoted, op, word = match.groups()
+        if dquoted is not None or squoted is not None:
+            tokens.append(("value", dquoted if squoted is None else squoted))
+        elif op:
+            tokens.append(("op", op))
+        elif word:
+            tokens.append(("word", word))
+    return tokens
+
+
+class _Query:
+    "Translate the simple subset of jql our magics use into sql"
+
+    def __init__(self, jql, myself):
+        self.tokens = _tokenize(jql)
+        self.pos = 0
+        self.myself = myself
+        self.where = []
+        self.params = []
+        self.order = []
+        self.projects = []
+        self._parse()
+
+    def _peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise LocalQueryError("unexpected end of query")
+        self.pos += 1
+        return token
+
+    def _keyword(self, offset=0):
+        kind, value = self._peek(offset)
+        return value.lower() if kind == "word" else None
+
+    def _value(self):
+        kind, value = self._next()
+        if kind == "op":
+            raise LocalQueryError("expected a value, got %s" % value)
+        if kind == "word" and self._peek() == ("op", "("):
+            self.pos += 1
+            if self._next() != ("op", ")") or value.lower() != "currentuser":
+                raise LocalQueryError("function %s() not supported" % value)
+            return self.myself
+        return value
+
+    def _values(self):
+        if self._next() != ("op", "("):
+            raise LocalQueryError("expected ( after in")
+        values = [self._value()]
+        while self._peek() == ("op", ","):
+            self.pos += 1
+            values.append(self._value())
+        if self._next() != ("op", ")"):
+            raise LocalQueryError("expected ) after in list")
+        return values
+
+    def _parse(self):
+        while self._peek()[0] is not None:
+            keyword = self._keyword()
+            if keyword == "and":
+                self.pos += 1
+            elif keyword == "order" and self._keyword(1) == "by":
+                self.pos += 2
+                self._parse_order()
+            else:
+                self._parse_clause()
+
+    def _parse_order(self):
+        while self._peek()[0] is not None:
+            field = self._next()[1].lower()
+            if field not in ORDER_COLUMNS:
+                raise LocalQueryError("can't order by %s locally" % field)
+            direction = "ASC"
+            if self._keyword() in ("asc", "desc"):
+                direction = self._next()[1].upper()
+            self.order.append("%s %s" % (ORDER_COLUMNS[field], direction))
+            if self._peek() == ("op", ","):
+                self.pos += 1
+
+    def _parse_clause(self):
+        field = self._next()[1].lower()
+        if field not in COLUMNS and field not in LIST_COLUMNS:
+            raise LocalQueryError("field %s is not indexed" % field)
+        kind, op = self._next()
+        op = op.lower()
+        if op == "not" and self._keyword() == "in":
+            self.pos += 1
+            op = "not in"
+        elif op == "is" and self._keyword() == "not":
+            self.pos += 1
+            op = "is not"
+        if op in ("in", "not in"):
+            values = self._values()
+        elif op in ("is", "is not"):
+            if self._keyword() not in ("empty", "null"):
+                raise LocalQueryError("only is EMPTY is supported")
+            self.pos += 1
+            values = []
+        elif op in ("=", "!=", "~", "!~"):
+            values = [self._value()]
+        else:
+            raise LocalQueryError("operator %s not supported" % op)
+        self._add(field, op, values)
+
+    def _add(self, field, op, values):
+        negate = op in ("not in", "!=", "!~", "is not")
+        if field == "project" and op in ("=", "in"):
+            self.projects.extend(value.upper() for value in values)
+        if op in ("is", "is not"):
+            column = COLUMNS.get(field) or LIST_COLUMNS[field]
+            clause = "(%s IS NULL OR %s IN ('', '||'))" % (column, column)
+        elif field in LIST_COLUMNS:
+            clause = " OR ".join(
+                ["%s LIKE ? COLLATE NOCASE" % LIST_COLUMNS[field]]
+                * len(values)
+            )
+            self.params.extend("%%|%s|%%" % value for value in values)
+        elif op in ("~", "!~"):
+            clause = "%s LIKE ? COLLATE NOCASE" % COLUMNS[field]
+            self.params.append("%%%s%%" % values[0])
+        else:
+            clause = "%s COLLATE NOCASE IN (%s)" % (
+                COLUMNS[field],
+                ",".join("?" * len(values)),
+            )
+            self.params.extend(values)
+        self.where.append(("NOT (%s)" if negate else "(%s)") % clause)
+
+    def sql(self, limit=None):
+        sql = "SELECT raw FROM issues"
+        if self.where:
+            sql += " WHERE " + " AND ".join(self.where)
+        if self.order:
+            sql += " ORDER BY " + ", ".join(self.order)
+        if limit is not None:
+            sql += " LIMIT %d" % limit
+        return sql
+
+
+class IssueIndex:
+    """A local sqlite copy of the issues in the configured projects
+
+    Kept current by syncing issues updated since the last sync.
+    """
+
+    def __init__(self, path=None, projects=(), fields=(), config=None):
+        self.config = config
+        self.path = os.path.expanduser(path or cache_path("issues.db", config))
+        self.projects = list(projects)
+        self.fields = list(dict.fromkeys(INDEX_FIELDS + list(fields)))
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def meta(self, name, default=None):
+        # the db is only created by the first sync
+        if not os.path.exists(self.path):
+            return default
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM meta WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def _row(self, issue, record):
+        fields = issue.raw.get("fields", {})
+
+        def account(name):
+            return (fields.get(name) or {}).get("accountId")
+
+        raw = {
+            "key": issue.raw["key"],
+            "id": issue.raw.get("id"),
+            "fields": {field: fields.get(field) for field in self.fields},
+        }
+        sprints = fields.get("customfield_10020") or []
+        return (
+            issue.raw["key"],
+            (fields.get("project") or {}).get("key"),
+            (fields.get("issuetype") or {}).get("name"),
+            (fields.get("status") or {}).get("name"),
+            account("assignee"),
+            account("reporter"),
+            fields.get("summary"),
+            _members(fields.get("labels") or []),
+            _members(v.get("name") for v in fields.get("fixVersions") or []),
+            _members(
+                [s.get("id") for s in sprints]
+                + [s.get("name") for s in sprints]
+            ),
+            fields.get("created"),
+            fields.get("updated"),
+            json.dumps(record),
+            json.dumps(raw),
+        )
+
+    def sync(self, jira, projector, full=False):
+        """Fetch issues updated since the last sync, returns the count"""
+        if not self.projects:
+            raise LocalQueryError("no index projects configured")
+        with self.lock:
+            start = server_now(jira)
+            jql = "project in (%s)" % ",".join(self.projects)
+            synced = None if full else self.meta("synced")
+            if synced:
+                jql += ' AND updated >= "%s"' % synced
+            pages = SearchPages(
+                jira,
+                jql + " ORDER BY updated ASC",
+                config=self.config,
+                fields=self.fields,
+            )
+            count = 0
+            with self._connect() as db:
+                db.executescript(SCHEMA)
+                if full:
+                    db.execute("DELETE FROM issues")
+                for page in pages:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO issues VALUES "
+                        "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            self._row(issue, record)
+                            for issue, record in zip(
+                                page, projector.project(page)
+                            )
+                        ],
+                    )
+                    count += len(page)
+                myself = jira.myself()
+                db.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [
+                        ("synced", jql_since(start)),
+                        ("synced_at", str(time.time())),
+                        ("myself", myself.get("accountId")),
+                        ("projects", ",".join(self.projects)),
+                    ],
+                )
+        return count
+
+    def age(self):
+        return time.time() - float(self.meta("synced_at", 0))
+
+    def search(self, jql, limit=None):
+        """Raw json of the indexed issues matching a simple jql query"""
+        if self.meta("synced") is None:
+            raise LocalQueryError("never synced, run %sync_index first")
+        query = _Query(jql, self.meta("myself"))
+        indexed = self.meta("projects", "").split(",")
+        missing = sorted(set(query.projects) - set(indexed))
+        if missing:
+            raise LocalQueryError(
+                "%s not indexed, add to index.projects and run %%sync_index"
+                % ", ".join(missing)
+            )
+        with self._connect() as db:
+            rows = db.execute(query.sql(limit), query.params).fetchall()
+        return [json.loads(raw) for (raw,) in rows]
+
+    def sync_forever(self, get_jira, projector, interval):
+        while True:
+            try:
+                if self.age() >= interval:
+                    count = self.sync(get_jira(), projector)
+                    logging.info(f"synced {count} issues to the local index")
+            except Exception:
+                logging.exception("error syncing local issue index")
+            time.sleep(interval)
+
+
+class LocalPages:
+    "SearchPages lookalike answered from an IssueIndex"
+
+    def __init__(self, index, jql, issue, limit=None, **kwargs):
+        self.index = index
+        self.jql = jql
+        self.issue = issue
+        self.limit = limit
+        self.total = None
+        self.count = 0
+        self.truncated = False
+
+    def __iter__(self):
+        limit = None if self.limit is None else self.limit + 1
+        page = self.index.search(self.jql, limit)
+        if self.limit is not None and len(page) > self.limit:
+            page = page[: self.limit]
+            self.truncated = True
+        self.count = len(page)
+        yield [self.issue(raw) for raw in page]
+
+    def issues(self):
+        for page in self:
+            yield from page
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from astmgr.index import LocalQueryError, _Query
+
+SELECT = "SELECT raw FROM issues"
+EMPTY = "(%s IS NULL OR %s IN ('', '||'))"
+
+
+@pytest.mark.parametrize(
+    "jql, sql, params",
+    [
+        (
+            "project = A",
+            SELECT + " WHERE (project COLLATE NOCASE IN (?))",
+            ["A"],
+        ),
+        (
+            'status in (Open, "In Progress")',
+            SELECT + " WHERE (status COLLATE NOCASE IN (?,?))",
+            ["Open", "In Progress"],
+        ),
+        (
+            "status not in (Done)",
+            SELECT + " WHERE NOT (status COLLATE NOCASE IN (?))",
+            ["Done"],
+        ),
+        (
+            "key != A-1",
+            SELECT + " WHERE NOT (key COLLATE NOCASE IN (?))",
+            ["A-1"],
+        ),
+        (
+            "labels in (a, b)",
+            SELECT + " WHERE (labels LIKE ? COLLATE NOCASE"
+            " OR labels LIKE ? COLLATE NOCASE)",
+            ["%|a|%", "%|b|%"],
+        ),
+        (
+            "labels is EMPTY",
+            SELECT + " WHERE (%s)" % (EMPTY % ("labels", "labels")),
+            [],
+        ),
+        (
+            "assignee is not null",
+            SELECT
+            + " WHERE NOT (%s)" % (EMPTY % ("assignee_id", "assignee_id")),
+            [],
+        ),
+        (
+            'summary ~ "crash"',
+            SELECT + " WHERE (summary LIKE ? COLLATE NOCASE)",
+            ["%crash%"],
+        ),
+        (
+            "text !~ crash",
+            SELECT + " WHERE NOT (summary LIKE ? COLLATE NOCASE)",
+            ["%crash%"],
+        ),
+        (
+            "assignee = currentUser()",
+            SELECT + " WHERE (assignee_id COLLATE NOCASE IN (?))",
+            ["me"],
+        ),
+        (
+            "sprint = 5 AND project = A ORDER BY updated DESC, key",
+            SELECT + " WHERE (sprints LIKE ? COLLATE NOCASE)"
+            " AND (project COLLATE NOCASE IN (?))"
+            " ORDER BY updated DESC, key ASC",
+            ["%|5|%", "A"],
+        ),
+        (
+            "order by lastViewed desc",
+            SELECT + " ORDER BY updated DESC",
+            [],
+        ),
+    ],
+)
+def test_query_sql(jql, sql, params):
+    query = _Query(jql, "me")
+    assert query.sql() == sql
+    assert query.params == params
+
+
+@pytest.mark.parametrize(
+    "jql",
+    [
+        "project = A OR project = B",
+        "(project = A)",
+        "project = A AND (status = Open)",
+        "assignee = membersOf(team)",
+        "created > -1d",
+        "priority = High",
+        "project = A ORDER BY rank",
+        "project in A",
+    ],
+)
+def test_query_rejects(jql):
+    with pytest.raises(LocalQueryError):
+        _Query(jql, "me")
+
+
+def test_query_limit():
+    assert _Query("project = A", "me").sql(10).endswith(" LIMIT 10")
+
+
+def test_local_search_after_sync(standin, magics, capsys):
+    # set after the constructor, its background sync would race this one
+    magics.index.projects = ["BENCH"]
+    magics.sync_index()
+    assert "synced %s issues" % standin.issues in capsys.readouterr().out
+    standin.reset()
+    magics.search("project = BENCH AND status = Done --local --limit 200")
+    assert standin.requests() == 0
+    assert sorted(row[0] for row in magics.results) == sorted(
+        "BENCH-%s" % number
+        for number in range(standin.issues)
+        if number % 3 == 2
+    )
+
+
+def test_index_db_created_on_first_sync(magics, capsys):
+    assert not os.path.exists(magics.index.path)
+    magics.search("project = BENCH --local")
+    assert "never synced, run %sync_index" in capsys.readouterr().out
+    assert not os.path.exists(magics.index.path)
+    magics.index.projects = ["BENCH"]
+    magics.sync_index()
+    assert os.path.exists(magics.index.path)
+    capsys.readouterr()
+    magics.search("project = OTHER --local")
+    assert "OTHER not indexed" in capsys.readouterr().out
@@ -1,73 +1,478 @@
+import contextlib
 import functools
+import io
+import itertools
+import json
 import logging
 import re
 import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pprint import pprint
 from subprocess import Popen
 
-import jmespath
-import yaml
 from IPython.core.magic import Magics, magics_class, line_magic
 from IPython.core.magic_arguments import (
     argument,
     magic_arguments,
     parse_argstring,
 )
-from docopt import docopt, DocoptExit
-from jira.exceptions import JIRAError
-from pygments import highlight
-from pygments.formatters import Terminal256Formatter
-from pygments.lexers import YamlLexer
-from tabulate import tabulate
 
-from astmgr.utils import get_gitlab, get_jira, get_config
-from astmgr import CONFIG
+from astmgr.batch import print_batch, run_batch
+from astmgr.cache import ORDER_BY, QueryCache, TTLCache
+from astmgr.index import IssueIndex, LocalPages, LocalQueryError
+from astmgr.prefetch import DEFAULT_PREFETCH, Prefetcher, raw_size
+from astmgr.usage import USAGES, parse_usage, usage
+from astmgr.watch import CapturedQuery, Watch
+from astmgr.transport import (
+    AsyncJira,
+    call_async,
+    executor,
+    gather,
+    run,
+    transport_settings,
+)
+from astmgr.utils import (
+    Lazy,
+    build_gitlab,
+    build_jira,
+    get_config,
+    get_gitlab,
+    get_jira,
+)
+from astmgr.projector import FieldProjector
+from astmgr.regression import RegressionScheduler
+from astmgr.render import YamlRenderer, renderer
+from astmgr.releases import ReleaseSnapshot, VersionCache
+from astmgr.rollover import Rollover
+from astmgr.search import (
+    DEFAULT_ORDER,
+    SearchPages,
+    fields_for,
+    search_defaults,
+    split_search_options,
+)
+from astmgr.scheduler import scheduler_stats
+from astmgr import stats
+from astmgr.stats import DEFAULT_STATS, carry, instrumented
+from astmgr.sprints import (
+    SprintRecord,
+    SprintRegistry,
+    load_cache,
+    save_cache,
+)
+
+# issue fields read by the tabular outputs, see _summary_row and _search_row
+# updated tells the prefetcher whether its cached copy is still current
+SUMMARY_FIELDS = ["summary", "updated"]
+SEARCH_FIELDS = ["summary", "labels", "customfield_10020", "updated"]
+# record keys of the rows above for json, ndjson and csv output
+SUMMARY_HEADERS = ["key", "summary"]
+SEARCH_HEADERS = ["key", "summary", "sprints", "labels"]
+COMMENT_FIELD_MAP = {
+    "id": "id",
+    "author": "author.displayName",
+    "body": "body",
+    "created": "created",
+    "updated": "updated",
+}
+# jql fields each write changes, cached searches filtering or sorting on them
+# are dropped
+WRITE_FIELDS = {
+    "assign": ["updated", "assignee"],
+    "comment": ["updated", "comment"],
+    "transition": [
+        "updated",
+        "status",
+        "statusCategory",
+        "resolution",
+        "resolved",
+    ],
+    "label": ["updated", "labels"],
+    # "epic" covers "Epic Link"
+    "add_to_epic": ["updated", "parent", "parentEpic", "epic"],
+    "add_to_sprint": ["updated", "sprint"],
+}
+# listing magics %watch can wrap, it runs them to capture their query so
+# they must not write anything first
+WATCHABLE = {
+    "search",
+    "sprints",
+    "mysprint",
+    "current_sprint",
+    "release_issues",
+    "recentlyviewedopen",
+    "myrecentlyviewedopen",
+    "recentlycreated",
+    "myrecentlycreated",
+    "reportedbyme",
+}
+# fields left out when cloning an issue
+CLONE_EXCLUDE = ("sprint", "status", "key", "reporter")
+
+
+def tabulate(*args, **kwargs):
+    from tabulate import tabulate
+
+    return tabulate(*args, **kwargs)
 
 
 def docoptwrapper(function):
     """
-    A decorator that wraps the passed in function and logs
-    exceptions should one occur
+    A decorator that wraps the passed in function and prints
+    its usage when the line doesn't match it
     """
 
     @functools.wraps(function)
     def wrapper(*args, **kwargs):
+        from docopt import DocoptExit
+
         try:
             return function(*args, **kwargs)
-        except SystemExit as e:
+        except DocoptExit:
+            print(function.usage.usage)
+        except SystemExit:
+            # --help, the usage printed the whole doc
             pass
-        except DocoptExit as e:
-            return function(args[0], "-h", **kwargs)
 
     return wrapper
 
 
+def _split(line):
+    try:
+        return shlex.split(line)
+    except ValueError:
+        return line.split()
+
+
+def _complete_name(typed, name):
+    """name as a completion of typed, its spaces quoted for shlex
+
+    The completion starts with typed as is, ipython drops any that don't.
+    """
+    if typed.startswith('"') or (" " in name and not name.startswith(typed)):
+        return '"%s"' % name
+    head, space, tail = name[len(typed) :].partition(" ")
+    if not space:
+        return name
+    return '%s%s"%s%s"' % (typed, head, space, tail)
+
+
 @magics_class
 class JiraMagics(Magics):
     "Magics that hold additional state"
 
-    def __init__(self, shell):
+    def __init__(self, shell, jira=None, config=None, gitlab=None):
         # You must call the parent constructor
         super().__init__(shell)
-        self.jira = get_jira()
-        self.boards = {}
-        self.load_sprints()
+        # jira, config and gitlab can be injected eg: by tests or benchmarks
+        self.CONFIG = config or get_config()
+        self.USERS = self.CONFIG.jira.users
+        self.FIELD_MAP = self.CONFIG.jira.field_map
+        self.ISSUE_FIELDS = fields_for(self.FIELD_MAP)
+        if "updated" not in self.ISSUE_FIELDS:
+            self.ISSUE_FIELDS.append("updated")
+        self.projector = FieldProjector(self.FIELD_MAP)
+        self.clone_projector = FieldProjector(
+            {
+                field: source
+                for field, source in self.FIELD_MAP.items()
+                if field not in CLONE_EXCLUDE
+            }
+        )
+        self.comment_projector = FieldProjector(COMMENT_FIELD_MAP)
+        self._regression = Lazy(
+            lambda: RegressionScheduler(
+                gitlab
+                or (
+                    get_gitlab()
+                    if config is None
+                    else build_gitlab(self.CONFIG)
+                ),
+                self.CONFIG.gitlab.testing_pipeline_project,
+                config=self.CONFIG,
+            )
+        )
+        # short lived, so a chain of magics on one ticket costs one GET
+        prefetch = dict(
+            DEFAULT_PREFETCH, **self.CONFIG.jira.get("prefetch", {})
+        )
+        ttl = self.CONFIG.jira.get("issue_cache_ttl", 60)
+        self.issue_cache = TTLCache(
+            ttl, maxbytes=prefetch["max_bytes"], sizeof=raw_size
+        )
+        self.comment_cache = TTLCache(
+            ttl, maxbytes=prefetch["max_bytes"], sizeof=raw_size
+        )
+        # show/comments of the top results of a listing read these
+        self.prefetch_count = prefetch["count"]
+        self.prefetcher = Prefetcher(
+            self._fetch_issue,
+            lambda key: self.jira.comments(key),
+            self.issue_cache,
+            self.comment_cache,
+            prefetch["workers"],
+        )
+        stats.set_history(
+            dict(DEFAULT_STATS, **self.CONFIG.get("stats", {}))["history"]
+        )
+        # repeated searches within cache_ttl are answered from here
+        search = search_defaults(self.CONFIG)
+        self.query_cache = QueryCache(
+            search["cache_ttl"], maxsize=search["cache_size"]
+        )
+        cache = self.CONFIG.get("cache") or {}
+        self.versions = VersionCache(
+            cache.get("versions_ttl", 3600), self.CONFIG
+        )
+        self.release_snapshot = ReleaseSnapshot(self.CONFIG)
+        # %watch polls in the background, _capture is set while it runs the
+        # magic it wraps to learn its query
+        self.watches = {}
+        self._watch_ids = itertools.count(1)
+        self._capture = None
+        # nothing here may touch the network, the client and sprints are
+        # built in the background and magics block only on what they use
+        self._jira = Lazy(
+            get_jira if config is None else lambda: build_jira(self.CONFIG)
+        )
+        if jira is not None:
+            self._jira.set(jira)
+        # awaitable jira calls, eg: await asyncio.gather(ajira.issue(..), ..)
+        executor(transport_settings(self.CONFIG.get("transport"))["pool_size"])
+        self.ajira = AsyncJira(lambda: self.jira)
         if shell:
-            self.shell.user_ns["boards"] = self.boards
-        self.USERS = CONFIG.jira.users
-        self.FIELD_MAP = CONFIG.jira.field_map
+            self.shell.user_ns["ajira"] = self.ajira
+            for name in USAGES:
+                self.shell.set_hook(
+                    "complete_command", self._complete, str_key="%" + name
+                )
+        self._sprints = Lazy(self._initial_sprints)
+        # the one off warming and refresh threads, close() waits on them
+        self._threads = [self._jira.warm(), self._sprints.warm()]
+        index = self.CONFIG.get("index") or {}
+        self.index = IssueIndex(
+            index.get("path"),
+            index.get("projects", []),
+            self.ISSUE_FIELDS,
+            self.CONFIG,
+        )
+        if self.index.projects:
+            threading.Thread(
+                target=self.index.sync_forever,
+                args=(
+                    lambda: self.jira,
+                    self.projector,
+                    index.get("sync_interval", 900),
+                ),
+                daemon=True,
+            ).start()
+
+    def close(self):
+        """Stop the watches and wait for the background work to finish"""
+        for watch in self.watches.values():
+            watch.stop()
+        for watch in self.watches.values():
+            watch.thread.join()
+        self.watches.clear()
+        self.prefetcher.pool.shutdown(wait=True)
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def jira(self):
+        return self._jira.get()
+
+    @property
+    def regression(self):
+        return self._regression.get()
+
+    @property
+    def sprint_registry(self):
+        return self._sprints.get()
+
+    @property
+    def boards(self):
+        return self.sprint_registry.boards
+
+    def _board_sprints(self, board):
+        from jira.exceptions import JIRAError
+
+        try:
+            # throttled requests are retried by the scheduler, errors that
+            # get here are real failures for this board
+            return self.jira.sprints(board.id, maxResults=False)
+        except JIRAError:
+            logging.warning(f"error getting sprint board {board.id}")
+            return []
+
+    def _fetch_sprints(self):
+        start = time.perf_counter()
+        boards = {}
+        jboards = self.jira.boards(maxResults=False)
+        with ThreadPoolExecutor(
+            max_workers=self.CONFIG.jira.get("sprint_workers", 8)
+        ) as pool:
+            for board, sprints in zip(
+                jboards, pool.map(carry(self._board_sprints), jboards)
+            ):
+                sprint_map = boards.setdefault((board.name, board.id), {})
+                for sprint in sprints:
+                    sprint_map[sprint.name] = SprintRecord.from_sprint(
+                        sprint, board.id
+                    )
+        save_cache(boards, self.CONFIG)
+        return boards, time.perf_counter() - start
+
+    def _set_boards(self, boards):
+        # a single reference swap, readers never see a half built registry
+        self._sprints.set(SprintRegistry(boards))
+        if self.shell:
+            self.shell.user_ns["boards"] = boards
+
+    def _refresh_sprints(self):
+        try:
+            boards, elapsed = self._fetch_sprints()
+        except Exception:
+            logging.exception("background sprint refresh failed")
+            return
+        self._set_boards(boards)
+        logging.info(
+            "refreshed sprints for %s boards in %.2fs" % (len(boards), elapsed)
+        )
+
+    def _load_boards(self, force=False, report=print):
+        if not force:
+            cache = self.CONFIG.get("cache") or {}
+            boards = load_cache(cache.get("sprints_ttl", 86400), self.CONFIG)
+            if boards is not None:
+                report("loaded sprints for %s boards from cache" % len(boards))
+                thread = threading.Thread(
+                    target=self._refresh_sprints, daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+                return boards
+        boards, elapsed = self._fetch_sprints()
+        report(
+            "fetched sprints for %s boards in %.2fs" % (len(boards), elapsed)
+        )
+        return boards
+
+    def _initial_sprints(self):
+        boards = self._load_boards(report=logging.info)
+        if self.shell:
+            self.shell.user_ns["boards"] = boards
+        return SprintRegistry(boards)
 
     @line_magic
+    @instrumented
+    @usage("""Load boards and sprints, from the local cache when fresh
+
+        Usage:
+            load_sprints [options]
+
+        Options:
+            -f --force  Skip the cache and fetch from jira
+        """)
     def load_sprints(self, line=None):
-        for board in self.jira.boards():
-            sprint_map = self.boards.setdefault((board.name, board.id), {})
+        args = parse_usage(self.load_sprints, line)
+        self._set_boards(self._load_boards(args["--force"]))
+
+    def _local_issue(self, raw):
+        from jira import JIRA
+        from jira.resources import Issue
+
+        options = dict(
+            JIRA.DEFAULT_OPTIONS, server=self.CONFIG.jira.api.server
+        )
+        return Issue(options, None, raw)
+
+    def _pages(self, query, local=False, cache=True, **kwargs):
+        """SearchPages for query, or LocalPages answered from the index
+
+        Pages come from the query cache unless cache is False, eg: when
+        selecting the issues a write changes.
+        """
+        if self._capture is not None:
+            self._capture.append((query, kwargs))
+            raise CapturedQuery()
+        if local:
+            return LocalPages(self.index, query, self._local_issue, **kwargs)
+        if cache and self.query_cache.ttl:
+            kwargs["cache"] = self.query_cache
+        return SearchPages(self.jira, query, config=self.CONFIG, **kwargs)
+
+    def _page_options(self, args):
+        return dict(
+            local=args["--local"],
+            limit=int(args["--limit"]) if args["--limit"] else None,
+            page_size=(
+                int(args["--page-size"]) if args["--page-size"] else None
+            ),
+        )
+
+    def _print_pages(
+        self, pages, row, headers, numbered=False, output="table", rule=False
+    ):
+        """Print each page of a SearchPages as it arrives, returns all rows
+
+        Rows are rendered as a table, or as json, ndjson or csv records
+        keyed by headers. Notices go to stderr when the output isn't a table.
+        """
+        if numbered:
+            headers = ["#"] + headers
+        try:
+            out = renderer(
+                output, None if output == "table" else headers, rule
+            )
+        except ValueError as e:
+            print(e)
+            return []
+        notices = sys.stdout if output == "table" else sys.stderr
+        results = []
+        listed = []
+        with out:
             try:
-                for sprint in self.jira.sprints(board.id):
-                    sprint_map[sprint.name] = sprint
-            except JIRAError:
-                logging.warning(f"error getting sprint board {board.id}")
-        print("fetched sprints")
+                for page in pages:
+                    listed.extend(
+                        (issue.key, getattr(issue.fields, "updated", None))
+                        for issue in page[: self.prefetch_count - len(listed)]
+                    )
+                    rows = [row(issue) for issue in page]
+                    if numbered:
+                        rows = [
+                            [len(results) + cnt] + r
+                            for cnt, r in enumerate(rows)
+                        ]
+                    results.extend(rows)
+                    out.write(rows)
+            except LocalQueryError as e:
+                print(
+                    "can't answer from the local index: %s" % e, file=notices
+                )
+        if pages.truncated:
+            print(
+                "showing %s of %s issues, raise --limit for more"
+                % (pages.count, pages.total or "more"),
+                file=notices,
+            )
+        if listed:
+            self.prefetcher.submit(listed)
+        return results
+
+    def _summary_row(self, issue):
+        return [issue.key, issue.fields.summary]
+
+    def _search_row(self, issue):
+        return [
+            issue.key,
+            issue.fields.summary,
+            ",".join(self.get_sprint(issue)),
+            ",".join(issue.fields.labels),
+        ]
 
     def get_sprint(self, issue, active=True):
         results = []
@@ -77,20 +482,23 @@ class JiraMagics(Magics):
         return results
 
     @line_magic
-    def sprints(self, line=None):
-        args = docopt(
-            """Get sprints
+    @instrumented
+    @usage("""Get sprints
 
-            Usage:
-                sprints [options]
+        Usage:
+            sprints [options]
 
-                -p --project=<project>  Project to use [default: POINTZI]
-                -a --assignee=<assignee>  Project to use [default: currentUser()]
-                -t --issuetype=<issuetype>  Issuetype to use [default: task]
-            """,
-            argv=shlex.split(line),
-        )
-        results = []
+        Options:
+            -p --project=<project>  Project to use [default: POINTZI]
+            -a --assignee=<assignee>  Project to use [default: currentUser()]
+            -t --issuetype=<issuetype>  Issuetype to use [default: task]
+            -l --limit=<limit>  Maximum number of issues
+            --page-size=<size>  Issues fetched per request
+            --local  Answer from the local issue index
+            -o --output=<format>  table, json, ndjson or csv [default: table]
+        """)
+    def sprints(self, line=None):
+        args = parse_usage(self.sprints, line)
         sprint = self._current_sprint()
         args["sprintid"] = sprint.id
         args["assignee"] = self.resolve_user(args.get("--assignee"))
@@ -98,83 +506,177 @@ class JiraMagics(Magics):
             **args
         )
         print(query)
-        for cnt, issue in enumerate(
-            self.jira.search_issues(query, maxResults=500)
-        ):
-            results.append(
+        print("Current Sprint : %s %s" % (sprint, sprint.id))
+        self._print_pages(
+            self._pages(
+                query,
+                fields=SUMMARY_FIELDS,
+                **self._page_options(args),
+            ),
+            self._summary_row,
+            SUMMARY_HEADERS,
+            numbered=True,
+            output=args["--output"],
+            rule=True,
+        )
+
+    @line_magic
+    @instrumented
+    @docoptwrapper
+    @usage("""Sync the local issue index with issues updated since last sync
+
+        Usage:
+            sync_index [options]
+
+        Options:
+            --full  Drop the index and sync every issue
+        """)
+    def sync_index(self, line=""):
+        args = parse_usage(self.sync_index, line)
+        if not self.index.projects:
+            print("no projects to index, set index.projects in astmgr.yaml")
+            return
+        start = time.perf_counter()
+        count = self.index.sync(self.jira, self.projector, full=args["--full"])
+        print(
+            "synced %s issues in %.2fs" % (count, time.perf_counter() - start)
+        )
+
+    @line_magic
+    @instrumented
+    def rate_limits(self, line=""):
+        """Request, throttle and retry counters per service"""
+        print(
+            tabulate(
                 [
-                    cnt,
-                    issue.key,
-                    issue.fields.summary,
-                ]
+                    dict(service=service, **stats)
+                    for service, stats in scheduler_stats().items()
+                ],
+                headers="keys",
             )
-        print("Current Sprint : %s %s" % (sprint, sprint.id))
-        print(tabulate(results))
+        )
 
     @line_magic
-    def search(self, line):
-        self.results = []
-        if "order by" not in line.lower():
-            line += " ORDER BY updated DESC, created DESC"
-        for issue in self.jira.search_issues(line, maxResults=10):
-            self.results.append(
+    @docoptwrapper
+    @usage("""Timings, requests and bytes of recent magics
+
+        Usage:
+            astmgr_stats [options]
+            astmgr_stats --reset
+
+        Options:
+            -n --last=<count>  Invocations to show [default: 20]
+            -m --magic=<magic>  Only invocations of this magic
+            -s --summary  Totals and means per magic instead
+            --export=<file>  Append the invocations to file as json lines
+            --reset  Forget the recorded invocations
+        """)
+    def astmgr_stats(self, line=""):
+        # not instrumented itself, it would fill the history with its calls
+        args = parse_usage(self.astmgr_stats, line)
+        if args["--reset"]:
+            stats.reset()
+            return
+        if args["--export"]:
+            count = stats.export(args["--export"], args["--magic"])
+            print("exported %s invocations to %s" % (count, args["--export"]))
+            return
+        records = stats.records(args["--magic"])
+        if args["--summary"]:
+            print(tabulate(stats.totals(records), headers="keys"))
+            return
+        rows = []
+        for record in records[-int(args["--last"]) :]:
+            rows.append(
                 [
-                    issue.key,
-                    issue.fields.summary,
-                    ",".join(self.get_sprint(issue)),
-                    ",".join(issue.fields.labels),
+                    record["magic"],
+                    record["line"][:30],
+                    record["wall"],
+                    sum(record["requests"].values()),
+                    sum(record["bytes"].values()) // 1024,
                 ]
+                + [record["phases"].get(name, "") for name in stats.PHASES]
+                + [record["error"] or ""]
+            )
+        print(
+            tabulate(
+                rows,
+                headers=["magic", "line", "wall", "requests", "KB"]
+                + stats.PHASES
+                + ["error"],
             )
+        )
 
-        print(tabulate(self.results, tablefmt="plain"))
+    @line_magic
+    @instrumented
+    def search(self, line):
+        line, options = split_search_options(line)
+        self._search(line, options)
+
+    def _search(self, line, options):
+        if "order by" not in line.lower():
+            line += DEFAULT_ORDER
+        options.setdefault("limit", search_defaults(self.CONFIG)["limit"])
+        output = options.pop("output", "table")
+        self.results = self._print_pages(
+            self._pages(line, fields=SEARCH_FIELDS, **options),
+            self._search_row,
+            SEARCH_HEADERS,
+            output=output,
+        )
+
+    def _canned_search(self, where, order, line):
+        """search where, narrowed by the jql in line and in its order if any"""
+        line, options = split_search_options(line)
+        query, *own = ORDER_BY.split(line, 1)
+        query = query.strip()
+        if query:
+            where = "%s AND (%s)" % (where, query) if where else query
+        order = "ORDER BY %s" % (own[0].strip() if own else order)
+        self._search(("%s %s" % (where, order)).strip(), options)
 
     def _current_sprint(self, qa=False):
-        for board, sprint_map in self.boards.items():
-            for sprint_name, sprint in sprint_map.items():
-                if (
-                    sprint.state.lower() == "active"
-                    and "qa" not in sprint.name.lower()
-                ):
-                    return sprint
+        return self.sprint_registry.current
 
     @line_magic
+    @instrumented
     def current_sprint(self, line=""):
-        results = []
+        line, options = split_search_options(line)
+        output = options.pop("output", "table")
         sprint = self._current_sprint()
         query = 'sprint = %s AND status in ("In Progress", Open)' % sprint.id
         print(query)
         if line:
             query += " AND " + line
-        for cnt, issue in enumerate(
-            self.jira.search_issues(query, maxResults=500)
-        ):
-            results.append(
-                [
-                    cnt,
-                    issue.key,
-                    issue.fields.summary,
-                ]
-            )
         print("Current Sprint : %s <id:%s>" % (sprint, sprint.id))
-        print(tabulate(results))
+        self._print_pages(
+            self._pages(query, fields=SUMMARY_FIELDS, **options),
+            self._summary_row,
+            SUMMARY_HEADERS,
+            numbered=True,
+            output=output,
+            rule=True,
+        )
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def mysprint(self, line=""):
-        args = docopt(
-            """search my sprint
+    @usage("""search my sprint
 
-            Usage:
-                mysprint [options] [<query>]
+        Usage:
+            mysprint [options] [<query>]
 
-            Options:
-                --all
-                -p --project=<project>  Project to use [default: POINTZI]
-                -t --issuetype=<issuetype>  Issuetype to use [default: task]
-            """,
-            argv=shlex.split(line),
-        )
-        results = []
+        Options:
+            --all
+            -p --project=<project>  Project to use [default: POINTZI]
+            -t --issuetype=<issuetype>  Issuetype to use [default: task]
+            -l --limit=<limit>  Maximum number of issues
+            --page-size=<size>  Issues fetched per request
+            --local  Answer from the local issue index
+            -o --output=<format>  table, json, ndjson or csv [default: table]
+        """)
+    def mysprint(self, line=""):
+        args = parse_usage(self.mysprint, line)
         sprint = self._current_sprint()
         query = "sprint = %s AND assignee = currentUser()" % sprint.id
         if not args["--all"] and not args["<query>"]:
@@ -182,42 +684,161 @@ class JiraMagics(Magics):
         print(query)
         if args["<query>"]:
             query += " AND " + args["<query>"]
-        for cnt, issue in enumerate(
-            self.jira.search_issues(query, maxResults=500)
-        ):
-            results.append(
-                [
-                    cnt,
-                    issue.key,
-                    issue.fields.summary,
-                ]
-            )
         print("Current Sprint : %s %s" % (sprint, sprint.id))
-        print(tabulate(results))
+        self._print_pages(
+            self._pages(
+                query,
+                fields=SUMMARY_FIELDS,
+                **self._page_options(args),
+            ),
+            self._summary_row,
+            SUMMARY_HEADERS,
+            numbered=True,
+            output=args["--output"],
+            rule=True,
+        )
 
     @magic_arguments()
-    @argument("-o", "--output", help="Print output format.")
-    @argument("id", type=str, help="Issue id.")
+    @argument(
+        "-o", "--output", default="yaml", help="yaml, json, ndjson or csv."
+    )
+    @argument("-e", "--expand", help="Expand eg: changelog,renderedFields.")
+    @argument("id", type=str, nargs="+", help="Issue ids.")
     @line_magic
+    @instrumented
     def show(self, args):
-        """Get Issue by id"""
+        """Get Issues by id, several ids are fetched concurrently"""
         args = parse_argstring(self.show, args)
-        self.pprint(self.jira.issue(args.id))
+        try:
+            out = renderer(args.output)
+        except ValueError as e:
+            print(e)
+            return
+        self.pprint(
+            *run(
+                gather(
+                    *(
+                        call_async(self._issue, key, expand=args.expand)
+                        for key in args.id
+                    )
+                )
+            ),
+            out=out,
+        )
+
+    def _fetch_issue(self, key, expand=None):
+        return self.jira.issue(
+            key, fields=",".join(self.ISSUE_FIELDS), expand=expand
+        )
 
-    def pprint(self, jissue):
-        issue = {}
-        for field, source in self.FIELD_MAP.items():
-            issue[field] = jmespath.search(source, jissue.raw)
+    def _issue(self, key, expand=None):
+        """Fetch the field map fields of an issue, reusing a recent fetch"""
+        if expand:
+            return self._fetch_issue(key, expand)
+        issue = self.issue_cache.get(key.upper())
+        if issue is None:
+            self.prefetcher.wait(self.issue_cache, key)
+            issue = self.issue_cache.get(key.upper())
+        if issue is None:
+            issue = self._fetch_issue(key)
+            self.issue_cache.set(key.upper(), issue)
+        return issue
 
-        issue["url"] = self.jira._options["server"] + "/browse/" + issue["key"]
-        yml = yaml.dump(issue)
-        print(highlight(yml, YamlLexer(), Terminal256Formatter()))
+    def _comments(self, key):
+        comments = self.comment_cache.get(key.upper())
+        if comments is None:
+            self.prefetcher.wait(self.comment_cache, key)
+            comments = self.comment_cache.get(key.upper())
+        if comments is None:
+            comments = self.jira.comments(key)
+            self.comment_cache.set(key.upper(), comments)
+        return comments
+
+    def _forget(self, *keys, fields=(), project=None):
+        """Drop what's cached about issues a write changed
+
+        Cached searches listing them, filtering or sorting on one of fields
+        or, for a created issue, on its project are dropped too.
+        """
+        for key in keys:
+            self.issue_cache.pop(key.upper())
+            self.comment_cache.pop(key.upper())
+        self.query_cache.invalidate(keys, fields, project)
+
+    def pprint(self, *jissues, out=None):
+        records = self.projector.project(jissues)
+        for issue in records:
+            issue["url"] = (
+                self.jira._options["server"] + "/browse/" + issue["key"]
+            )
+        with out or YamlRenderer() as out:
+            out.write(records)
+
+    def _argument_values(self, argument, prefix):
+        if argument in ("<nick>", "<assignee>"):
+            values = self.USERS
+        elif argument == "<transition>":
+            values = self.CONFIG.jira.transitions
+        elif argument == "<sprint>" and self._sprints.built:
+            # never block a keystroke on fetching sprints
+            return [
+                _complete_name(prefix, name)
+                for name in self.sprint_registry.complete(prefix.lstrip('"'))
+            ]
+        else:
+            return []
+        return [value for value in values if value.startswith(prefix)]
+
+    def _complete(self, shell, event):
+        """Options, nicks, transitions and sprints for the magic's usage"""
+        usage = USAGES[event.command.lstrip("%")]
+        head, quote, quoted = event.line.rpartition('"')
+        if quote and event.line.count('"') % 2:
+            # an open quote, eg: a sprint name with spaces
+            words = _split(head)[1:]
+            prefix = quote + quoted
+        else:
+            words = _split(event.line)[1:]
+            prefix = ""
+            if words and not event.line.endswith(" "):
+                prefix = words.pop()
+        if prefix.startswith("-"):
+            option, equals, value = prefix.partition("=")
+            if not equals:
+                matches = usage.complete(prefix)
+            else:
+                matches = [
+                    option + "=" + match
+                    for match in self._argument_values(
+                        usage.argument(option), value
+                    )
+                ]
+        else:
+            matches = [
+                match
+                for argument in usage.expects(words)
+                for match in self._argument_values(argument, prefix)
+            ]
+        # ipython only replaces the symbol, which stops at - and =
+        cut = len(prefix) - len(event.symbol)
+        return [match[cut:] for match in matches]
 
     def resolve_user(self, user):
         return self.USERS.get(user, user)
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""Create an issue
+
+        Usage:
+            create [options] <summary> <description>
+
+            -p --project=<project>  Project to use [default: POINTZI]
+            -a --assignee=<assignee>  Project to use [default: currentUser()]
+            -t --issuetype=<issuetype>  Issuetype to use [default: task]
+            -e --epicname=<epicname> Epic name
+        """)
     def create(self, line=""):
         ISSUE_TYPES = {
             "task": "Task",
@@ -228,20 +849,8 @@ class JiraMagics(Magics):
             "epic": "Epic",
             "story": "Story",
         }
-        args = docopt(
-            """Create an issue
-
-            Usage:
-                create [options] <summary> <description>
-
-                -p --project=<project>  Project to use [default: POINTZI]
-                -a --assignee=<assignee>  Project to use [default: currentUser()]
-                -t --issuetype=<issuetype>  Issuetype to use [default: task]
-                -e --epicname=<epicname> Epic name
-            """,
-            argv=shlex.split(line),
-        )
-        issuetype = jira.ISSUE_TYPES[args["--issuetype"]]
+        args = parse_usage(self.create, line)
+        issuetype = ISSUE_TYPES[args["--issuetype"]]
         issue = {
             "summary": args["<summary>"],
             "description": args["<description>"],
@@ -253,389 +862,725 @@ class JiraMagics(Magics):
         if args["--issuetype"] == "epic":
             issue["customfield_10018"] = args["--epicname"]
         issue = self.jira.create_issue(issue)
+        self._created(issue)
         self.pprint(issue)
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def open(self, line=""):
-        args = docopt(
-            """ Open issue in browser
+    @usage(""" Open issue in browser
 
-            Usage:
-                open <id>
+        Usage:
+            open <id>
 
-            Options:
-                --browser=<browser>  default browser to use [default: xdg]
-            """,
-            argv=shlex.split(line),
+        Options:
+            --browser=<browser>  default browser to use [default: xdg]
+        """)
+    def open(self, line=""):
+        args = parse_usage(self.open, line)
+        permalink = "%s/browse/%s" % (
+            self.jira._options["server"].rstrip("/"),
+            args["<id>"],
         )
-        issue = self.jira.issue(args["<id>"])
-        Popen(["/usr/sbin/firefox", "-P", "work", issue.permalink()])
+        Popen(["/usr/sbin/firefox", "-P", "work", permalink])
 
     @line_magic
-    def roll_sprint(self):
-        self.load_sprints()
-        sprint = self._current_sprint()
-        input("closing sprint %s" % sprint)
-        print(self.jira.update_sprint(sprint.id, state="closed"))
-        qaitems = [
-            x.key
-            for x in self.jira.search_issues(
-                "sprint = %s AND status = 'Waiting for QA'" % sprint.id
+    @instrumented
+    @docoptwrapper
+    @usage("""Close the current sprint and carry its QA issues into a new one
+
+        An unfinished rollover is resumed from its checkpoint.
+
+        Usage:
+            roll_sprint [options]
+
+        Options:
+            -n --dry-run  Print the plan and stop
+            -y --yes  Don't ask before closing the sprint
+            --name=<name>  Name of the new sprint, eg: "Pointzi Week 42"
+            --status=<status>  Status carried over [default: Waiting for QA]
+            --chunk=<n>  Issues moved per request, at most 50 [default: 50]
+            --workers=<n>  Concurrent moves [default: 4]
+            --restart  Forget an unfinished rollover and plan a new one
+        """)
+    def roll_sprint(self, line=""):
+        args = parse_usage(self.roll_sprint, line)
+        rollover = Rollover.resume(self.jira, self.CONFIG)
+        if rollover and args["--restart"]:
+            rollover.forget()
+            rollover = None
+        if rollover:
+            print(
+                "resuming the rollover of %s"
+                % rollover.state["sprint"]["name"]
             )
-        ]
-        qasprint = self.jira.create_sprint(
-            datetime.now().strftime("Pointzi Week %W")
+        else:
+            self.load_sprints("--force")
+            sprint = self._current_sprint()
+            if sprint is None:
+                print("no active sprint to close")
+                return
+            if sprint.board_id is None:
+                print("no board known for sprint %s" % sprint)
+                return
+            rollover = Rollover.plan(
+                self.jira,
+                sprint,
+                args["--name"] or datetime.now().strftime("Pointzi Week %W"),
+                args["--status"],
+                int(args["--chunk"]),
+                self.CONFIG,
+            )
+        print("\n".join(rollover.describe()))
+        if args["--dry-run"]:
+            return
+        if not args["--yes"] and input("continue? [y/N] ").lower() != "y":
+            return
+        failed = rollover.run(int(args["--workers"]))
+        self._forget(
+            *rollover.state["issues"], fields=WRITE_FIELDS["add_to_sprint"]
         )
-        print("Created sprint %s" % qasprint)
-        self.jira.add_issues_to_sprint(qasprint.id, qaitems)
+        print("\n".join(rollover.describe()))
+        if failed:
+            for chunk, error in failed:
+                print(
+                    "failed moving %s issues %s..%s: %s"
+                    % (len(chunk), chunk[0], chunk[-1], error)
+                )
+            print("run %roll_sprint again to retry the failed moves")
 
     @line_magic
+    @instrumented
     def recentlyviewed(self, line=""):
-        return self.search("order by lastViewed DESC")
+        return self._canned_search("", "lastViewed DESC", line)
 
     @line_magic
+    @instrumented
     def recentlyviewedopen(self, line=""):
-        return self.search(
-            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") order by lastViewed DESC'
+        return self._canned_search(
+            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress")',
+            "lastViewed DESC",
+            line,
         )
 
     @line_magic
+    @instrumented
     def myrecentlyviewedopen(self, line=""):
-        return self.search(
-            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") AND assignee in (currentUser()) order by lastViewed DESC'
+        return self._canned_search(
+            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") AND assignee in (currentUser())',
+            "lastViewed DESC",
+            line,
         )
 
     @line_magic
+    @instrumented
     def recentlycreated(self, line=""):
-        return self.search(
-            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") ORDER BY created DESC, lastViewed DESC'
+        return self._canned_search(
+            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress")',
+            "created DESC, lastViewed DESC",
+            line,
         )
 
     @line_magic
+    @instrumented
     def myrecentlycreated(self, line=""):
-        return self.search(
-            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") AND assignee in (currentUser()) ORDER BY created DESC, lastViewed DESC'
+        return self._canned_search(
+            'status in ("In Progress", Open, Pending, Reopened, Testing, "Waiting for QA", "Work in progress") AND assignee in (currentUser())',
+            "created DESC, lastViewed DESC",
+            line,
         )
 
     @line_magic
+    @instrumented
+    @usage("""Delete issue
+        Usage:
+            delete <id>
+        """)
     def delete(self, line=""):
-        args = docopt(
-            """Delete issue
-            Usage:
-                delete <id>
-            """,
-            argv=shlex.split(line),
-        )
-        self.jira.issue(args["<id>"]).delete()
+        args = parse_usage(self.delete, line)
+        self.jira._session.delete(self.jira._get_url(f"issue/{args['<id>']}"))
+        # only the searches that listed it change
+        self._forget(args["<id>"])
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""Cone issue
+        Usage:
+            clone <id>
+        """)
     def clone(self, line=""):
-        CLONE_FIELDS = dict(self.FIELD_MAP)
-        CLONE_FIELDS.pop("sprint")
-        CLONE_FIELDS.pop("status")
-        CLONE_FIELDS.pop("key")
-        CLONE_FIELDS.pop("reporter")
-        args = docopt(
-            """Cone issue
-            Usage:
-                clone <id>
-            """,
-            argv=shlex.split(line),
-        )
-        i0 = self.jira.issue(args["<id>"])
-        issue = {}
-        for field, source in CLONE_FIELDS.items():
-            issue[field] = jmespath.search(source, i0.raw)
-        self.pprint(self.jira.create_issue(issue))
+        args = parse_usage(self.clone, line)
+        i0 = self._issue(args["<id>"])
+        (issue,) = self.clone_projector.project([i0])
+        issue = self.jira.create_issue(issue)
+        self._created(issue)
+        self.pprint(issue)
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""Move issue to another project
+        Usage:
+            move <id> <project>
+        """)
     def move(self, line=""):
-        args = docopt(
-            """Move issue to another project
-            Usage:
-                move <id> <project>
-            """,
-            argv=shlex.split(line),
-        )
-        i0 = self.jira.issue(args["<id>"])
-        issue = {}
-        for field, source in self.FIELD_MAP.items():
-            issue[field] = jmespath.search(source, i0.raw)
+        args = parse_usage(self.move, line)
+        i0 = self._issue(args["<id>"])
+        (issue,) = self.projector.project([i0])
         issue["project"] = args["<project>"]
-        self.pprint(self.jira.create_issue(**issue))
+        issue = self.jira.create_issue(**issue)
+        self._created(issue)
+        self.pprint(issue)
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""Assign issues
+        Usage:
+            assign <ids> <nick> [options]
+            assign --jql=<jql> <nick> [options]
+
+        <ids>  Issue key or comma separated keys eg: POINTZI-1,POINTZI-2
+
+        Options:
+            --jql=<jql>  Assign every issue matching the query
+            -w --workers=<workers>  Concurrent edits
+        """)
     def assign(self, line=""):
-        args = docopt(
-            """Assign issue
-            Usage:
-            assign <id> <nick>
-            """,
-            argv=shlex.split(line),
-        )
-        print(
-            self.jira.assign_issue(
-                self.jira.issue(args["<id>"]),
-                account_id=self.USERS.get(args["<nick>"], args["<nick>"]),
-            )
+        args = parse_usage(self.assign, line)
+        account_id = self.resolve_user(args["<nick>"])
+        self._batch(
+            args,
+            lambda key: self.jira._session.put(
+                self.jira._get_latest_url(f"issue/{key}/assignee"),
+                data=json.dumps({"accountId": account_id}),
+            ).status_code,
+            WRITE_FIELDS["assign"],
         )
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""comment on issues
+        Usage:
+            comment <ids> <comment> [options]
+            comment --jql=<jql> <comment> [options]
+
+        <ids>  Issue key or comma separated keys eg: POINTZI-1,POINTZI-2
+
+        Options:
+            --jql=<jql>  Comment on every issue matching the query
+            -w --workers=<workers>  Concurrent edits
+        """)
     def comment(self, line=""):
-        args = docopt(
-            """comment on issue
-            Usage:
-                comment <id> <comment>
-            """,
-            argv=shlex.split(line),
-        )
+        args = parse_usage(self.comment, line)
         regex = re.compile(r"(?<![@\w])@(\w{1,25})")
-        pprint(
-            self.jira.add_comment(
-                self.jira.issue(args["<id>"]),
-                regex.sub(
-                    lambda x: "[~accountid:%s]"
-                    % self.USERS.get(x.groups()[0], x.groups()[0]),
-                    args["<comment>"],
-                ),
-            )
+        body = regex.sub(
+            lambda x: "[~accountid:%s]"
+            % self.USERS.get(x.groups()[0], x.groups()[0]),
+            args["<comment>"],
+        )
+        self._batch(
+            args,
+            lambda key: self.jira.add_comment(key, body),
+            WRITE_FIELDS["comment"],
         )
 
-    def print_comment(self, comment):
-        _comment = {}
-        FIELD_MAP = {
-            "id": "id",
-            "author": "author.displayName",
-            "body": "body",
-            "created": "created",
-            "updated": "updated",
-        }
-        for field, source in FIELD_MAP.items():
-            _comment[field] = jmespath.search(source, comment.raw)
+    def _issue_keys(self, args):
+        if args["--jql"]:
+            return [
+                issue.key
+                for issue in self._pages(
+                    args["--jql"], cache=False, fields=["key"]
+                ).issues()
+            ]
+        return args["<ids>"].split(",")
 
-        print(
-            highlight(yaml.dump(_comment), YamlLexer(), Terminal256Formatter())
-        )
+    def _batch(self, args, function, fields=()):
+        """Run function for every issue key selected by args, report each
+
+        fields are the jql fields function changes, see _forget
+        """
+        keys = self._issue_keys(args)
+        workers = args["--workers"] or self.CONFIG.jira.get("batch_workers", 8)
+        print_batch(run_batch(function, keys, int(workers)))
+        self._forget(*keys, fields=fields)
+
+    def _created(self, issue):
+        self._forget(project=issue.key.rsplit("-", 1)[0])
+
+    def print_comment(self, *comments, out=None):
+        with out or YamlRenderer() as out:
+            out.write(self.comment_projector.project(comments))
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""get issue comments
+        Usage:
+            comments <id> [options]
+
+        Options:
+            -o --output=<format>  yaml, json, ndjson or csv [default: yaml]
+        """)
     def comments(self, line=""):
-        args = docopt(
-            """get issue comments
-            Usage:
-                comments <id>
-            """,
-            argv=shlex.split(line),
-        )
-        for comment in self.jira.comments(
-            self.jira.issue(args["<id>"]),
-        ):
-            self.print_comment(comment)
+        args = parse_usage(self.comments, line)
+        try:
+            out = renderer(args["--output"])
+        except ValueError as e:
+            print(e)
+            return
+        self.print_comment(*self._comments(args["<id>"]), out=out)
 
     @line_magic
+    @instrumented
     def reportedbyme(self, line=""):
-        return self.search(
-            "reporter in (currentUser()) ORDER BY updated DESC, created DESC, lastViewed DESC"
+        return self._canned_search(
+            "reporter in (currentUser())",
+            "updated DESC, created DESC, lastViewed DESC",
+            line,
         )
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""transition issues
+        Usage:
+            transition <ids> <transition> <comment> [options]
+            transition --jql=<jql> <transition> <comment> [options]
+
+        <ids>  Issue key or comma separated keys eg: POINTZI-1,POINTZI-2
+        <transition>  One of jira.transitions in the config
+
+        Options:
+            --jql=<jql>  Transition every issue matching the query
+            -w --workers=<workers>  Concurrent edits
+        """)
     def transition(self, line=""):
-        TRANSITIONS = CONFIG.jira.transitions
-        args = docopt(
-            """transition issue to %s
-            Usage:
-                assign <id> <transition> <comment>
-            """
-            % TRANSITIONS,
-            argv=shlex.split(line),
-        )
-        print(
-            (
+        TRANSITIONS = self.CONFIG.jira.transitions
+        args = parse_usage(self.transition, line)
+        if args["<transition>"] not in TRANSITIONS:
+            print("unknown transition %s" % args["<transition>"])
+            return
+
+        def transition(key):
+            return (
                 self.jira.transition_issue(
-                    self.jira.issue(args["<id>"]),
+                    key,
                     TRANSITIONS[args["<transition>"]],
                     comment=args.get("<comment>"),
                 ),
-                self.jira.add_comment(
-                    self.jira.issue(args["<id>"]),
-                    args["<comment>"],
-                ),
+                self.jira.add_comment(key, args["<comment>"]),
             )
-        )
+
+        self._batch(args, transition, WRITE_FIELDS["transition"])
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""label issues with list of labels eg: sdk,performance
+        Usage:
+            label <ids> <labels> [options]
+            label --jql=<jql> <labels> [options]
+
+        <ids>  Issue key or comma separated keys eg: POINTZI-1,POINTZI-2
+
+        Options:
+            --jql=<jql>  Label every issue matching the query
+            -w --workers=<workers>  Concurrent edits
+        """)
     def label(self, line=""):
-        args = docopt(
-            """label issue with list of labels eg: sdk,performance
-            Usage:
-                label <id> <labels>
-            """,
-            argv=shlex.split(line),
+        args = parse_usage(self.label, line)
+        # an add operation keeps existing labels without fetching them first
+        update = {
+            "labels": [{"add": label} for label in args["<labels>"].split(",")]
+        }
+        self._batch(
+            args,
+            lambda key: self.jira._session.put(
+                self.jira._get_url(f"issue/{key}"),
+                data=json.dumps({"update": update}),
+            ).status_code,
+            WRITE_FIELDS["label"],
         )
-        i0 = self.jira.issue(args["<id>"])
-        i0.fields.labels.extend(args["<labels>"].split(","))
-        print(i0.update(fields={"labels": i0.fields.labels}))
 
     @line_magic
+    @instrumented
     @docoptwrapper
+    @usage("""add list of issues to epic
+        Usage:
+            label <epicid> <ids> ...
+        """)
     def add_to_epic(self, line=""):
-        args = docopt(
-            """add list of issues to epic
-            Usage:
-                label <epicid> <ids> ...
-            """,
-            argv=shlex.split(line),
-        )
+        args = parse_usage(self.add_to_epic, line)
         print(self.jira.add_issues_to_epic(args["<epicid>"], args["<ids>"]))
+        self._forget(*args["<ids>"], fields=WRITE_FIELDS["add_to_epic"])
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def add_to_sprint(self, line=""):
-        args = docopt(
-            """add list of issues to sprint
-            Usage:
-                label <sprint> <ids> ...
+    @usage("""add list of issues to sprint
+        Usage:
+            label <sprint> <ids> ...
 
-            <sprint>    Can be a sprint id or name or literal 'current' for current sprint
-            """,
-            argv=shlex.split(line),
-        )
+        <sprint>    Can be a sprint id or name or literal 'current' for current sprint
+        """)
+    def add_to_sprint(self, line=""):
+        args = parse_usage(self.add_to_sprint, line)
         sprint = args["<sprint>"]
         if sprint == "current":
             sprint = self._current_sprint().id
         elif sprint.isnumeric():
             sprint = int(sprint)
         else:
-            for board in self.boards.values():
-                for sprintname, sprintdata in board.items():
-                    if sprintname == sprint:
-                        sprint = sprintdata.id
-                        print("Sprint name:%s id:%s" % (sprintname, sprint))
-                        break
+            sprintname = sprint
+            sprintdata = self.sprint_registry.by_name.get(sprintname)
+            if sprintdata is None:
+                print(
+                    "unknown sprint %s, close matches: %s"
+                    % (
+                        sprintname,
+                        ", ".join(self.sprint_registry.fuzzy(sprintname)),
+                    )
+                )
+                return
+            sprint = sprintdata.id
+            print("Sprint name:%s id:%s" % (sprintname, sprint))
         print(self.jira.add_issues_to_sprint(sprint, args["<ids>"]))
+        self._forget(*args["<ids>"], fields=WRITE_FIELDS["add_to_sprint"])
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def releases(self, line=""):
-        args = docopt(
-            """list pending releases
+    @usage("""list pending releases
 
-            Usage:
-                releases <project> [options] 
+        Usage:
+            releases <project> [options] 
 
-            Options:
-                --all
-            """,
-            argv=shlex.split(line),
-        )
-        releases = self.jira._get_json(f"project/{args['<project>']}/versions")
-        if not args["--all"]:
-            releases = [x for x in releases if not x["released"]]
+        Options:
+            --all
+            -r --refresh  Refetch the versions instead of using the cache
+        """)
+    def releases(self, line=""):
+        args = parse_usage(self.releases, line)
+        if args["--all"]:
+            releases = sorted(
+                self.versions.versions(
+                    self.jira, args["<project>"], args["--refresh"]
+                ),
+                key=lambda x: x.get("startDate", ""),
+            )
+        else:
+            releases = self.versions.unreleased(
+                self.jira, args["<project>"], args["--refresh"]
+            )
         displayfields = ["name", "userStartDate"]
         print(
             tabulate(
                 [
                     {x: y for x, y in release.items() if x in displayfields}
-                    for release in sorted(
-                        releases, key=lambda x: x.get("startDate", "")
-                    )
+                    for release in releases
                 ]
             )
         )
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def release_issues(self, line=""):
-        args = docopt(
-            """list pending releases
+    @usage("""Issue counts of every unreleased version by status or assignee
 
-            Usage:
-                releases <release> [options] 
+        Only issues updated since the last view are fetched, use --full
+        to rebuild the counts from scratch.
 
-            Options:
-                --all
-            """,
-            argv=shlex.split(line),
-        )
-        self.results = []
-        line = f"fixVersion = {args['<release>']}"
+        Usage:
+            release_dashboard <project>... [options]
 
-        if "order by" not in line.lower():
-            line += " ORDER BY updated DESC, created DESC"
-        for issue in self.jira.search_issues(line, maxResults=10):
-            self.results.append(
-                [
-                    issue.key,
-                    issue.fields.summary,
-                    ",".join(self.get_sprint(issue)),
-                    ",".join(issue.fields.labels),
-                ]
+        Options:
+            -b --by=<by>  status or assignee [default: status]
+            -f --full  Refetch every issue of the unreleased versions
+            -r --refresh  Refetch the versions instead of using the cache
+        """)
+    def release_dashboard(self, line=""):
+        args = parse_usage(self.release_dashboard, line)
+        projects = args["<project>"]
+        if args["--by"] not in ("status", "assignee"):
+            print("--by must be status or assignee")
+            return
+
+        def refresh(project):
+            versions = self.versions.unreleased(
+                self.jira, project, args["--refresh"]
             )
+            self.release_snapshot.refresh(self.jira, project, args["--full"])
+            return versions
 
-        print(tabulate(self.results, tablefmt="plain"))
+        with ThreadPoolExecutor(max_workers=len(projects)) as pool:
+            unreleased = dict(
+                zip(projects, pool.map(carry(refresh), projects))
+            )
+        for project, versions in unreleased.items():
+            counts = self.release_snapshot.counts(project, args["--by"])
+            columns = sorted(
+                {column for counter in counts.values() for column in counter}
+            )
+            print(project)
+            print(
+                tabulate(
+                    [
+                        [
+                            version["name"],
+                            version.get("releaseDate", ""),
+                            sum(counts.get(version["name"], {}).values()),
+                        ]
+                        + [
+                            counts.get(version["name"], {}).get(column, 0)
+                            for column in columns
+                        ]
+                        for version in versions
+                    ],
+                    headers=["version", "release date", "issues"] + columns,
+                )
+            )
 
     @line_magic
+    @instrumented
     @docoptwrapper
-    def run_regression(self, line=""):
-        args = docopt(
-            """Find all the jira tickets for a release and 
-            then schedule a bdd run to execute test tagged with the tickets found.
+    @usage("""list pending releases
 
-            Usage:
-                run_regresion <release> [options] 
+        Usage:
+            releases <release> [options] 
 
-            Options:
-                -v --verbose  More info please
-            """,
-            argv=shlex.split(line),
-        )
-        self.results = set([])
-        release = args["<release>"]
-        line = f"fixVersion = {release}"
+        Options:
+            --all
+            -l --limit=<limit>  Maximum number of issues
+            --page-size=<size>  Issues fetched per request
+            --local  Answer from the local issue index
+            -o --output=<format>  table, json, ndjson or csv [default: table]
+        """)
+    def release_issues(self, line=""):
+        args = parse_usage(self.release_issues, line)
+        line = f"fixVersion = {args['<release>']}"
 
         if "order by" not in line.lower():
-            line += " ORDER BY updated DESC, created DESC"
-        pipelines = {}
-        for issue in self.jira.search_issues(line, maxResults=10):
-            self.results.add(
-                issue.key,
-            )
-            pipelines.setdefault(issue.key.split("-")[0], [])
-            pipelines[issue.key.split("-")[0]].append(issue.key)
-        print(" --tags ".join(self.results))
+            line += DEFAULT_ORDER
+        self.results = self._print_pages(
+            self._pages(
+                line,
+                fields=SEARCH_FIELDS,
+                **self._page_options(args),
+            ),
+            self._search_row,
+            SEARCH_HEADERS,
+            output=args["--output"],
+        )
+
+    @line_magic
+    @instrumented
+    @docoptwrapper
+    @usage("""Find all the jira tickets for one or more releases and
+        then schedule a bdd run per release to execute test tagged with
+        the tickets found.
+
+        Usage:
+            run_regresion <release>... [options]
+            run_regresion --jql=<jql> [options]
+
+        Options:
+            -v --verbose  More info please
+            --jql=<jql>  Schedule every fixVersion of the issues found
+            -l --limit=<limit>  Maximum number of issues
+            --page-size=<size>  Issues fetched per request
+            --local  Find the issues in the local issue index
+        """)
+    def run_regression(self, line=""):
+        args = parse_usage(self.run_regression, line)
+        requested = args["<release>"]
+        if requested:
+            versions = ", ".join('"%s"' % release for release in requested)
+            line = f"fixVersion in ({versions}) ORDER BY key ASC"
+        else:
+            line = args["--jql"]
+        # one query for every release, grouped by release then project
+        pipelines = {release: {} for release in requested}
+        for issue in self._pages(
+            line, fields=["key", "fixVersions"], **self._page_options(args)
+        ).issues():
+            project = issue.key.split("-")[0]
+            for version in issue.fields.fixVersions:
+                if requested and version.name not in pipelines:
+                    continue
+                pipelines.setdefault(version.name, {}).setdefault(
+                    project, []
+                ).append(issue.key)
+        if not pipelines:
+            print("no releases found")
+            return
+        self.results = {
+            release: sorted(key for keys in projects.values() for key in keys)
+            for release, projects in pipelines.items()
+        }
+        for release, keys in self.results.items():
+            print("%s: %s" % (release, " --tags ".join(keys)))
+            if args["--verbose"]:
+                print(tabulate(pipelines[release].items()))
         # https://python-gitlab.readthedocs.io/en/stable/gl_objects/pipelines_and_jobs.html#pipeline-schedule
-        gitlab = get_gitlab()
-        project = gitlab.projects.get(CONFIG.gitlab.testing_pipeline_project)
-        scheds = project.pipelineschedules.list()
-        regression = f"{release} - Regression created by the AssistantManager"
-        scheduled = [
-            sched
-            for sched in scheds
-            if sched.description.startswith(regression)
-        ]
-        if not scheduled:
-            logging.info(f"creating schedule: {regression}")
-            scheduled = project.pipelineschedules.create(
-                {
-                    "ref": "staging",
-                    "description": regression,
-                    "cron": "0 */3 * * *",
+        schedules = self.regression.upsert_many(
+            {
+                release: {
+                    "TAGS": ",".join(["astmgr-regression"] + keys),
+                    "DEPLOYMENTS": "staging",
                 }
+                for release, keys in self.results.items()
+            }
+        )
+        print(
+            tabulate(
+                [
+                    (
+                        schedule.id,
+                        schedule.description,
+                        len(self.results[release]),
+                        (
+                            "set " + ", ".join(changed)
+                            if changed
+                            else "unchanged"
+                        ),
+                    )
+                    for release, (schedule, changed) in schedules.items()
+                ],
+                headers=["schedule", "description", "issues", ""],
             )
-        else:
-            scheduled = scheduled[0]
-        scheduled.variables.create(
-            dict(
-                key="TAGS", value=",".join(["astmgr-regression"] + self.results)
+        )
+
+    def _report_watch(self, watch, changes):
+        rows = []
+        for change, key, row, before in changes:
+            status, sprints = row["status"], row["sprints"]
+            if change == "status":
+                status = "%s -> %s" % (before["status"], status)
+            elif change == "moved":
+                sprints = "%s -> %s" % (before["sprints"] or "-", sprints)
+            rows.append([change, key, status, sprints, row["summary"]])
+        print(
+            "\n%s watch %s: %s"
+            % (watch.polled.strftime("%H:%M:%S"), watch.id, watch.line)
+        )
+        print(tabulate(rows, tablefmt="plain"))
+
+    @line_magic
+    @instrumented
+    @docoptwrapper
+    @usage("""Poll a search magic, printing only the issues that changed
+
+        New issues, status changes, sprint moves and issues that no longer
+        match are printed as they are found. Options go before the magic,
+        the rest of the line is the magic's, eg:
+            %watch -i 60 current_sprint
+            %watch search assignee = currentUser()
+
+        Usage:
+            watch [options] <magic> [<line>]
+            watch --list
+            watch --stop=<id>
+
+        Options:
+            -i --interval=<seconds>  First poll interval [default: 30]
+            --shortest=<seconds>  Interval while busy [default: 10]
+            --longest=<seconds>  Interval while quiet [default: 300]
+            -l --list  List the running watches
+            -s --stop=<id>  Stop a watch, all stops every watch
+        """)
+    def watch(self, line=""):
+        # the options end at the magic's name, the rest is passed on as is
+        head, rest = line, ""
+        skip = False
+        for word in re.finditer(r"\S+", line):
+            if skip:
+                skip = False
+            elif word.group().startswith("-"):
+                skip = "=" not in word.group() and bool(
+                    self.watch.usage.argument(word.group())
+                )
+            else:
+                head, rest = line[: word.end()], line[word.end() :].strip()
+                break
+        args = parse_usage(self.watch, head)
+        if args["--list"]:
+            print(
+                tabulate(
+                    [
+                        [
+                            watch.id,
+                            watch.line,
+                            len(watch.snapshot),
+                            watch.ticks,
+                            watch.changes,
+                            "%.0fs" % watch.interval,
+                        ]
+                        for watch in self.watches.values()
+                    ],
+                    headers=[
+                        "id",
+                        "watching",
+                        "issues",
+                        "polls",
+                        "changes",
+                        "every",
+                    ],
+                )
+            )
+            return
+        if args["--stop"]:
+            if args["--stop"] == "all":
+                ids = list(self.watches)
+            elif args["--stop"].isdigit():
+                ids = [int(args["--stop"])]
+            else:
+                print("--stop takes a watch id or all")
+                return
+            for id in ids:
+                watch = self.watches.pop(id, None)
+                if watch is None:
+                    print("no watch %s" % id)
+                else:
+                    watch.stop()
+            return
+        name = args["<magic>"].lstrip("%")
+        if name not in WATCHABLE:
+            print(
+                "can't watch %s, use one of %s"
+                % (name, ", ".join(sorted(WATCHABLE)))
             )
-        ).save()
-        scheduled.variables.create(
-            dict(key="DEPLOYMENTS", value="staging")
-        ).save()
+            return
+        magic = self.magics["line"][name]
+        self._capture = []
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                magic(rest)
+        except CapturedQuery:
+            pass
+        finally:
+            captured, self._capture = self._capture, None
+        if not captured:
+            print("%%%s %s doesn't search, nothing to watch" % (name, rest))
+            return
+        query, kwargs = captured[0]
+        watch = Watch(
+            self.jira,
+            query,
+            self._report_watch,
+            float(args["--interval"]),
+            float(args["--shortest"]),
+            float(args["--longest"]),
+            limit=kwargs.get("limit"),
+            config=self.CONFIG,
+        )
+        if not watch.where:
+            # nothing to poll updates of, eg: ORDER BY lastViewed
+            print("%%%s %s has no filter to watch" % (name, rest))
+            return
+        watch.id = next(self._watch_ids)
+        watch.line = ("%%%s %s" % (name, rest)).strip()
+        self.watches[watch.id] = watch.start()
+        print("watch %s: %s" % (watch.id, query))
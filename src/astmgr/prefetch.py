@@ -0,0 +1,75 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PREFETCH = {"count": 0, "workers": 4, "max_bytes": 16 * 1024 * 1024}
+
+
+def raw_size(value):
+    """Approximate memory of a jira resource, or a list of them"""
+    if isinstance(value, list):
+        return sum(raw_size(item) for item in value)
+    return len(json.dumps(getattr(value, "raw", value), default=str))
+
+
+class Prefetcher:
+    """Fetch issues and their comments into the caches in the background
+
+    Listings submit their top keys with each issue's updated timestamp, a
+    cached issue with the same timestamp is still fresh and isn't fetched
+    again, an older one is dropped along with its comments.
+    """
+
+    def __init__(self, fetch_issue, fetch_comments, issues, comments, workers):
+        self.fetch_issue = fetch_issue
+        self.fetch_comments = fetch_comments
+        self.issues = issues
+        self.comments = comments
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="astmgr-prefetch"
+        )
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _fresh(self, key, updated):
+        issue = self.issues.get(key)
+        return (
+            issue is not None
+            and updated is not None
+            and getattr(issue.fields, "updated", None) == updated
+            and self.comments.get(key) is not None
+        )
+
+    def _fetch(self, cache, fetch, key):
+        try:
+            cache.set(key, fetch(key))
+        except Exception:
+            logging.warning(f"error prefetching {key}", exc_info=True)
+        finally:
+            with self.lock:
+                self.pending.pop((id(cache), key), None)
+
+    def submit(self, listed):
+        """Prefetch (key, updated) pairs unless cached and unchanged"""
+        for key, updated in listed:
+            key = key.upper()
+            if self._fresh(key, updated):
+                continue
+            for cache, fetch in (
+                (self.issues, self.fetch_issue),
+                (self.comments, self.fetch_comments),
+            ):
+                cache.pop(key)
+                with self.lock:
+                    if (id(cache), key) not in self.pending:
+                        self.pending[(id(cache), key)] = self.pool.submit(
+                            self._fetch, cache, fetch, key
+                        )
+
+    def wait(self, cache, key):
+        """Block until an in flight prefetch of key into cache is done"""
+        with self.lock:
+            future = self.pending.get((id(cache), key.upper()))
+        if future is not None:
+            future.result()
@@ -0,0 +1,56 @@
+import json
+
+from astmgr.stats import phase
+
+
+class FieldProjector:
+    """Project issue json through a field map of jmespath expressions
+
+    The expressions are compiled once, on first use, combined into a single
+    multiselect hash so each record is projected in one pass.
+    """
+
+    def __init__(self, field_map):
+        self.field_map = dict(field_map)
+        self.expressions = None
+        self.expression = None
+
+    def _compile(self):
+        import jmespath
+        from jmespath.exceptions import JMESPathError
+
+        expressions = {
+            field: jmespath.compile(source)
+            for field, source in self.field_map.items()
+        }
+        try:
+            expression = jmespath.compile(
+                "{%s}"
+                % ", ".join(
+                    "%s: (%s)" % (json.dumps(field), source)
+                    for field, source in self.field_map.items()
+                )
+            )
+        except JMESPathError:
+            # fall back to one expression per field
+            expression = None
+        self.expression = expression
+        self.expressions = expressions
+
+    def _project(self, raw):
+        if self.expression is not None:
+            return self.expression.search(raw)
+        return {
+            field: expression.search(raw)
+            for field, expression in self.expressions.items()
+        }
+
+    def project(self, records):
+        """Project jira resources (or their raw json) into plain dicts"""
+        with phase("project"):
+            if self.expressions is None:
+                self._compile()
+            return [
+                self._project(getattr(record, "raw", record))
+                for record in records
+            ]
@@ -1,10 +1,17 @@
 from IPython.terminal.prompts import Prompts, Token
 
+from astmgr import stats
+
 
 class JiraPrompt(Prompts):
     jira_url = None
 
-    def __init__(self, shell, jira_url):
+    def __init__(self, shell, jira_url=None):
+        # IPython builds prompts_class(shell), the url comes from the config
+        if jira_url is None:
+            from astmgr.utils import get_config
+
+            jira_url = get_config().jira.api.server
         self.jira_url = jira_url
         shell.prompts = self
         super().__init__(shell)
@@ -14,3 +21,7 @@ class JiraPrompt(Prompts):
             (Token, self.jira_url),
             (Token.Prompt, " >>> "),
         ]
+
+    def bottom_toolbar(self):
+        """The last magic's timings, see %astmgr_stats"""
+        return stats.summary()
@@ -0,0 +1,153 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from astmgr.stats import carry
+from astmgr.utils import read_cache, write_cache
+
+SCHEDULE_INDEX = "pipeline_schedules.json"
+DESCRIPTION = "{release} - Regression created by the AssistantManager"
+
+
+class RegressionScheduler:
+    """Create or update the gitlab pipeline schedules regression runs use
+
+    Schedule ids are kept in a description index on disk, so reruns get
+    their schedule directly instead of listing every schedule.
+    """
+
+    def __init__(self, gitlab, project_id, workers=4, config=None):
+        # lazy: we only ever need the project's id in request urls
+        self.project = gitlab.projects.get(project_id, lazy=True)
+        self.project_id = str(project_id)
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.config = config
+        self.index = read_cache(SCHEDULE_INDEX, config).get(
+            self.project_id, {}
+        )
+
+    def _save_index(self):
+        # one file for every project, keep the others' indexes
+        data = read_cache(SCHEDULE_INDEX, self.config)
+        data[self.project_id] = self.index
+        write_cache(SCHEDULE_INDEX, data, self.config)
+
+    def _reindex(self):
+        logging.info("listing pipeline schedules of %s" % self.project_id)
+        self.index = {
+            schedule.description: schedule.id
+            for schedule in self.project.pipelineschedules.list(iterator=True)
+        }
+        self._save_index()
+
+    def _get(self, description):
+        from gitlab.exceptions import GitlabGetError
+
+        schedule_id = self.index.get(description)
+        if schedule_id is None:
+            return None
+        try:
+            schedule = self.project.pipelineschedules.get(schedule_id)
+        except GitlabGetError:
+            return None
+        if schedule.description != description:
+            return None
+        return schedule
+
+    def _find_prefix(self, description):
+        for indexed in sorted(self.index):
+            if indexed.startswith(description):
+                return self._get(indexed)
+        return None
+
+    def _set_variable(self, schedule, existing, key, value):
+        if key in existing:
+            schedule.variables.update(key, {"value": value})
+        else:
+            schedule.variables.create({"key": key, "value": value})
+
+    def _create(self, description, ref, cron):
+        logging.info(f"creating schedule: {description}")
+        schedule = self.project.pipelineschedules.create(
+            {"ref": ref, "description": description, "cron": cron}
+        )
+        with self.lock:
+            self.index[description] = schedule.id
+        return schedule
+
+    def upsert_many(self, releases, ref="staging", cron="0 */3 * * *"):
+        """Make a schedule per release exist with its variables set
+
+        releases maps release name to a dict of variables. All schedules
+        are looked up, created and updated in one concurrent pass and the
+        index is listed at most once. Only variables whose value changed
+        are written, so reruns are idempotent.
+
+        Returns {release: (schedule, [keys written])}.
+        """
+        descriptions = {
+            release: DESCRIPTION.format(release=release)
+            for release in releases
+        }
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            schedules = dict(
+                zip(
+                    releases,
+                    pool.map(carry(self._get), descriptions.values()),
+                )
+            )
+            missing = [
+                release
+                for release, schedule in schedules.items()
+                if schedule is None
+            ]
+            if missing:
+                self._reindex()
+                for release in missing:
+                    schedules[release] = self._find_prefix(
+                        descriptions[release]
+                    )
+            created = [
+                release
+                for release, schedule in schedules.items()
+                if schedule is None
+            ]
+            schedules.update(
+                zip(
+                    created,
+                    pool.map(
+                        carry(
+                            lambda release: self._create(
+                                descriptions[release], ref, cron
+                            )
+                        ),
+                        created,
+                    ),
+                )
+            )
+            if created:
+                self._save_index()
+            writes = []
+            results = {}
+            for release, schedule in schedules.items():
+                existing = {
+                    variable["key"]: variable["value"]
+                    for variable in schedule.attributes.get("variables") or []
+                }
+                changed = [
+                    key
+                    for key, value in releases[release].items()
+                    if existing.get(key) != value
+                ]
+                writes.extend(
+                    (schedule, existing, key, releases[release][key])
+                    for key in changed
+                )
+                results[release] = (schedule, changed)
+            list(
+                pool.map(
+                    carry(lambda write: self._set_variable(*write)), writes
+                )
+            )
+        return results
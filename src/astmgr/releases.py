@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import Counter
+
+from astmgr.search import SearchPages, jql_since, server_now
+from astmgr.utils import read_cache, write_cache
+
+VERSION_CACHE = "versions.json"
+DASHBOARD_CACHE = "release_dashboard.json"
+DASHBOARD_FIELDS = ["fixVersions", "status", "assignee"]
+
+
+class VersionCache:
+    """Project versions, fetched at most once per ttl and kept on disk"""
+
+    def __init__(self, ttl, config=None):
+        self.ttl = ttl
+        self.config = config
+        self.lock = threading.Lock()
+        self.data = read_cache(VERSION_CACHE, config)
+
+    def versions(self, jira, project, refresh=False):
+        entry = self.data.get(project)
+        if refresh or not entry or time.time() - entry["fetched"] > self.ttl:
+            entry = {
+                "fetched": time.time(),
+                "versions": jira._get_json(f"project/{project}/versions"),
+            }
+            with self.lock:
+                self.data[project] = entry
+                write_cache(VERSION_CACHE, self.data, self.config)
+        return entry["versions"]
+
+    def unreleased(self, jira, project, refresh=False):
+        return sorted(
+            (
+                version
+                for version in self.versions(jira, project, refresh)
+                if not version.get("released")
+            ),
+            key=lambda version: version.get("startDate", ""),
+        )
+
+
+class ReleaseSnapshot:
+    """fixVersion, status and assignee of every issue in unreleased versions
+
+    The first refresh of a project runs one query over all its unreleased
+    versions, later ones only fetch issues updated since the last refresh.
+    """
+
+    def __init__(self, config=None):
+        self.config = config
+        self.lock = threading.Lock()
+        self.data = read_cache(DASHBOARD_CACHE, config)
+
+    def refresh(self, jira, project, full=False):
+        """Bring a project up to date, returns the number of issues fetched"""
+        start = server_now(jira)
+        entry = None if full else self.data.get(project)
+        if entry:
+            issues = dict(entry["issues"])
+            jql = 'project = "%s" AND updated >= "%s"' % (
+                project,
+                entry["synced"],
+            )
+        else:
+            issues = {}
+            jql = 'project = "%s" AND fixVersion in unreleasedVersions()' % (
+                project
+            )
+        count = 0
+        for issue in SearchPages(
+            jira,
+            jql + " ORDER BY updated ASC",
+            config=self.config,
+            fields=DASHBOARD_FIELDS,
+        ).issues():
+            count += 1
+            fields = issue.raw["fields"]
+            versions = [
+                version["name"]
+                for version in fields.get("fixVersions") or []
+                if not version.get("released")
+            ]
+            if not versions:
+                # moved out of or released with its versions
+                issues.pop(issue.key, None)
+                continue
+            issues[issue.key] = [
+                versions,
+                (fields.get("status") or {}).get("name"),
+                (fields.get("assignee") or {}).get("displayName"),
+            ]
+        with self.lock:
+            self.data[project] = {
+                "synced": jql_since(start),
+                "issues": issues,
+            }
+            write_cache(DASHBOARD_CACHE, self.data, self.config)
+        return count
+
+    def counts(self, project, by="status"):
+        """{version: Counter of status or assignee} for a project"""
+        column = 1 if by == "status" else 2
+        counts = {}
+        entry = self.data.get(project) or {"issues": {}}
+        for issue in entry["issues"].values():
+            for version in issue[0]:
+                counts.setdefault(version, Counter())[
+                    issue[column] or "Unassigned"
+                ] += 1
+        return counts
@@ -0,0 +1,213 @@
+import functools
+import json
+import sys
+
+from astmgr.stats import phase
+
+# yaml output larger than this prints without colours, pygments is slow
+HIGHLIGHT_LIMIT = 64 * 1024
+# rows used to size the columns of a table, later rows may overflow them
+SAMPLE_ROWS = 50
+
+
+@functools.lru_cache(maxsize=None)
+def _yaml_highlighter():
+    from pygments.formatters import Terminal256Formatter
+    from pygments.lexers import YamlLexer
+
+    return YamlLexer(), Terminal256Formatter()
+
+
+@functools.lru_cache(maxsize=None)
+def _yaml_dumper():
+    import yaml
+
+    return getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+class Renderer:
+    """Write rows (lists, or dicts) to a stream as they arrive
+
+    Use as a context manager, or call close() after the last write.
+    """
+
+    def __init__(self, headers=None, stream=None):
+        self.headers = headers
+        self.stream = stream or sys.stdout
+
+    def _record(self, row):
+        if isinstance(row, dict):
+            return row
+        if self.headers:
+            return dict(zip(self.headers, row))
+        return row
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TableRenderer(Renderer):
+    """Plain text columns, sized from the first rows written
+
+    Nothing is buffered so each page prints as soon as it arrives, rule
+    draws dashes above and below like tabulate's simple format.
+    """
+
+    def __init__(self, headers=None, stream=None, rule=False):
+        super().__init__(headers, stream)
+        self.rule = rule
+        self.widths = None
+
+    def _line(self, cells):
+        return "  ".join(
+            (
+                str(cell).rjust(width)
+                if isinstance(cell, (int, float))
+                else str(cell).ljust(width)
+            )
+            for cell, width in zip(cells, self.widths)
+        ).rstrip()
+
+    def _dashes(self):
+        return "  ".join("-" * width for width in self.widths)
+
+    def write(self, rows):
+        if not rows:
+            return
+        if isinstance(rows[0], dict):
+            self.headers = self.headers or list(rows[0])
+            rows = [
+                [row.get(header) for header in self.headers] for row in rows
+            ]
+        lines = []
+        if self.widths is None:
+            sample = rows[:SAMPLE_ROWS]
+            if self.headers:
+                sample = [self.headers] + sample
+            self.widths = [
+                max(len(str(cell)) for cell in column)
+                for column in zip(*sample)
+            ]
+            if self.headers:
+                lines += [self._line(self.headers), self._dashes()]
+            elif self.rule:
+                lines.append(self._dashes())
+        lines.extend(self._line(row) for row in rows)
+        self.stream.write("\n".join(lines) + "\n")
+
+    def close(self):
+        if self.rule and self.widths is not None:
+            self.stream.write(self._dashes() + "\n")
+        super().close()
+
+
+class YamlRenderer(Renderer):
+    """One yaml document per row, highlighted only on a terminal
+
+    Highlighting stops once HIGHLIGHT_LIMIT bytes have been written.
+    """
+
+    def __init__(self, headers=None, stream=None, highlight=None):
+        super().__init__(headers, stream)
+        if highlight is None:
+            isatty = getattr(self.stream, "isatty", None)
+            highlight = bool(isatty and isatty())
+        self.highlight = highlight
+        self.written = 0
+
+    def write(self, rows):
+        import yaml
+
+        for row in rows:
+            with phase("yaml"):
+                text = yaml.dump(self._record(row), Dumper=_yaml_dumper())
+            self.written += len(text)
+            if self.highlight and self.written <= HIGHLIGHT_LIMIT:
+                from pygments import highlight
+
+                with phase("highlight"):
+                    text = highlight(text, *_yaml_highlighter())
+            self.stream.write(text + "\n")
+
+
+class JsonRenderer(Renderer):
+    "A single json array, written an element at a time"
+
+    def __init__(self, headers=None, stream=None):
+        super().__init__(headers, stream)
+        self.count = 0
+
+    def write(self, rows):
+        for row in rows:
+            self.stream.write("[\n" if not self.count else ",\n")
+            self.stream.write(json.dumps(self._record(row)))
+            self.count += 1
+
+    def close(self):
+        self.stream.write("\n]\n" if self.count else "[]\n")
+        super().close()
+
+
+class NdjsonRenderer(Renderer):
+    def write(self, rows):
+        self.stream.write(
+            "".join(json.dumps(self._record(row)) + "\n" for row in rows)
+        )
+
+
+class CsvRenderer(Renderer):
+    def __init__(self, headers=None, stream=None):
+        import csv
+
+        super().__init__(headers, stream)
+        self.writer = csv.writer(self.stream)
+        self.started = False
+
+    def write(self, rows):
+        for row in rows:
+            if isinstance(row, dict):
+                self.headers = self.headers or list(row)
+                row = [row.get(header) for header in self.headers]
+            if not self.started:
+                if self.headers:
+                    self.writer.writerow(self.headers)
+                self.started = True
+            self.writer.writerow(
+                [
+                    (
+                        json.dumps(cell)
+                        if isinstance(cell, (dict, list))
+                        else cell
+                    )
+                    for cell in row
+                ]
+            )
+
+
+RENDERERS = {
+    "table": TableRenderer,
+    "yaml": YamlRenderer,
+    "json": JsonRenderer,
+    "ndjson": NdjsonRenderer,
+    "csv": CsvRenderer,
+}
+
+
+def renderer(output, headers=None, rule=False):
+    """The renderer for an -o/--output name, rule only applies to tables"""
+    if output not in RENDERERS:
+        raise ValueError(
+            "unknown output %s, use one of %s" % (output, ", ".join(RENDERERS))
+        )
+    if output == "table":
+        return TableRenderer(headers, rule=rule)
+    return RENDERERS[output](headers)
@@ -0,0 +1,143 @@
+import contextlib
+import os
+import threading
+
+from astmgr.batch import run_batch
+from astmgr.search import SearchPages
+from astmgr.utils import cache_path, read_cache, write_cache
+
+ROLLOVER_CHECKPOINT = "rollover.json"
+# jira's agile api moves at most this many issues per request
+MAX_CHUNK = 50
+
+
+class Rollover:
+    """Close a sprint and carry its unfinished issues into a new one
+
+    plan() pages through every issue to carry over, run() then closes the
+    sprint, creates the new one and moves the issues in chunks. Each step
+    is saved to a checkpoint in the cache dir as soon as it's done, so a
+    rollover that fails part way resumes there instead of starting over.
+    """
+
+    def __init__(self, jira, state, config=None):
+        self.jira = jira
+        self.state = state
+        self.config = config
+        self.lock = threading.Lock()
+
+    @classmethod
+    def plan(cls, jira, sprint, name, status, chunk=MAX_CHUNK, config=None):
+        query = 'sprint = %s AND status = "%s" ORDER BY key' % (
+            sprint.id,
+            status,
+        )
+        keys = [
+            issue.key
+            for issue in SearchPages(
+                jira, query, page_size=100, config=config, fields=["key"]
+            ).issues()
+        ]
+        return cls(
+            jira,
+            {
+                "sprint": sprint.to_dict(),
+                "name": name,
+                "status": status,
+                "chunk": min(chunk, MAX_CHUNK),
+                "issues": keys,
+                "closed": False,
+                "new_sprint": None,
+                "moved": [],
+            },
+            config,
+        )
+
+    @classmethod
+    def resume(cls, jira, config=None):
+        """The unfinished rollover in the checkpoint, or None"""
+        state = read_cache(ROLLOVER_CHECKPOINT, config)
+        return cls(jira, state, config) if state else None
+
+    @property
+    def pending(self):
+        moved = set(self.state["moved"])
+        return [key for key in self.state["issues"] if key not in moved]
+
+    def chunks(self):
+        pending = self.pending
+        size = self.state["chunk"]
+        return [
+            pending[start : start + size]
+            for start in range(0, len(pending), size)
+        ]
+
+    def describe(self):
+        state = self.state
+        sprint = state["sprint"]
+        new_sprint = state["new_sprint"]
+        return [
+            "%s sprint %s <id:%s>"
+            % (
+                "closed" if state["closed"] else "close",
+                sprint["name"],
+                sprint["id"],
+            ),
+            (
+                "created sprint %s <id:%s>" % (state["name"], new_sprint)
+                if new_sprint
+                else "create sprint %s on board %s"
+                % (state["name"], sprint["board_id"])
+            ),
+            "move %s of %s %r issues in %s requests"
+            % (
+                len(self.pending),
+                len(state["issues"]),
+                state["status"],
+                len(self.chunks()),
+            ),
+        ]
+
+    def save(self):
+        write_cache(ROLLOVER_CHECKPOINT, self.state, self.config)
+
+    def forget(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(cache_path(ROLLOVER_CHECKPOINT, self.config))
+
+    def close(self):
+        if not self.state["closed"]:
+            self.jira.update_sprint(self.state["sprint"]["id"], state="closed")
+            self.state["closed"] = True
+            self.save()
+
+    def create(self):
+        if not self.state["new_sprint"]:
+            sprint = self.jira.create_sprint(
+                self.state["name"], self.state["sprint"]["board_id"]
+            )
+            self.state["new_sprint"] = sprint.id
+            self.save()
+        return self.state["new_sprint"]
+
+    def _move(self, chunk):
+        self.jira.add_issues_to_sprint(self.state["new_sprint"], chunk)
+        with self.lock:
+            self.state["moved"].extend(chunk)
+            self.save()
+        return len(chunk)
+
+    def move(self, workers=4):
+        """Move the pending issues, returns the chunks that failed"""
+        results = run_batch(self._move, self.chunks(), workers)
+        return [(chunk, error) for chunk, ok, error in results if not ok]
+
+    def run(self, workers=4):
+        """Every remaining step, the checkpoint is removed once all are done"""
+        self.save()
+        self.close()
+        self.create()
+        failed = self.move(workers)
+        if not failed:
+            self.forget()
+        return failed
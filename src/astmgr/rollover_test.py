@@ -0,0 +1,39 @@
+from astmgr.rollover import Rollover
+from astmgr.sprints import SprintRecord
+from astmgr.utils import build_jira
+
+
+def _requests(standin, method, route):
+    return sum(
+        count
+        for name, count in standin.counts.items()
+        if name.startswith(method) and name.endswith(route)
+    )
+
+
+def test_resume_retries_only_the_pending_chunk(standin, config):
+    jira = build_jira(config)
+    sprint = SprintRecord(1003, "Board 1 Sprint 3", "active", 1)
+    rollover = Rollover.plan(
+        jira, sprint, "next", "Waiting for QA", config=config
+    )
+    assert len(rollover.chunks()) == 3
+    standin.failing = {"BENCH-60"}
+    failed = rollover.run(workers=1)
+    assert [chunk for chunk, error in failed] == [
+        ["BENCH-%s" % number for number in range(50, 100)]
+    ]
+
+    standin.failing = set()
+    standin.reset()
+    resumed = Rollover.resume(jira, config)
+    assert resumed.pending == [
+        "BENCH-%s" % number for number in range(50, 100)
+    ]
+    assert resumed.run() == []
+    # closed and created before the failure, not again
+    assert _requests(standin, "PUT", r"/sprint/(?P<sprint>\d+)$") == 0
+    assert _requests(standin, "POST", r"/sprint$") == 0
+    assert _requests(standin, "POST", r"/issue$") == 1
+    assert len(standin.moved) == standin.issues
+    assert Rollover.resume(jira, config) is None
@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from collections import Counter
+
+DEFAULT_RATE_LIMIT = {
+    "rate": 10.0,
+    "burst": 20,
+    "retries": 5,
+    "backoff": 1.0,
+    "max_backoff": 60.0,
+}
+THROTTLED = (429, 503)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return None
+
+
+class RequestScheduler:
+    """A token bucket every request to one service waits on
+
+    The bucket is retuned from the rate limit headers jira and gitlab send
+    back, and a Retry-After pauses everyone until it has passed.
+    """
+
+    def __init__(self, rate, burst, retries, backoff, max_backoff, name=None):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = Counter()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    self.counters["requests"] += 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                self.counters["waits"] += 1
+            time.sleep(wait)
+
+    def observe(self, response):
+        """Tune the bucket from a response's rate limit headers"""
+        headers = response.headers
+        limit = _header(headers, "X-RateLimit-Limit", "RateLimit-Limit")
+        remaining = _header(
+            headers, "X-RateLimit-Remaining", "RateLimit-Remaining"
+        )
+        fill_rate = _header(headers, "X-RateLimit-FillRate")
+        interval = _header(headers, "X-RateLimit-Interval-Seconds")
+        retry_after = _header(headers, "Retry-After")
+        with self.lock:
+            if limit:
+                self.capacity = limit
+            if fill_rate and interval:
+                self.rate = fill_rate / interval
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+            if retry_after:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + retry_after
+                )
+
+    def delay(self, attempt, response):
+        if _header(response.headers, "Retry-After"):
+            # observe() paused the bucket, acquire() waits it out
+            return 0
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        # jitter so concurrent workers don't all retry at the same moment
+        return delay * random.uniform(0.5, 1.5)
+
+    def throttled(self, response):
+        return response.status_code == 429 or (
+            response.status_code in THROTTLED
+            and "Retry-After" in response.headers
+        )
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters, rate=round(self.rate, 2), burst=self.capacity
+            )
+
+
+def get_scheduler(name, settings=None):
+    """The shared scheduler for a service eg: jira or gitlab"""
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = RequestScheduler(
+                name=name, **dict(DEFAULT_RATE_LIMIT, **(settings or {}))
+            )
+        return _schedulers[name]
+
+
+def scheduler_stats():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
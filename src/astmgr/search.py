@@ -0,0 +1,241 @@
+import re
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from astmgr.stats import carry
+from astmgr.utils import get_config
+
+SEARCH_OPTION = re.compile(r"(?:^|\s)--(limit|page-size)[= ](\d+)(?=\s|$)")
+LOCAL_OPTION = re.compile(r"(?:^|\s)--local(?=\s|$)")
+OUTPUT_OPTION = re.compile(r"(?:^|\s)(?:-o|--output)[= ](\w+)(?=\s|$)")
+# the order search appends when the query has none
+DEFAULT_ORDER = " ORDER BY updated DESC, created DESC"
+# a quoted string, whose spaces are kept, or a run of whitespace
+JQL_SPACE = re.compile(r"(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')|\s+")
+# top level keys of an issue that are not requested through fields=
+ISSUE_KEYS = {"key", "id", "self", "expand", "changelog", "renderedFields"}
+JQL_DATE = "%Y/%m/%d %H:%M"
+JIRA_TIME = "%Y-%m-%dT%H:%M:%S.%f%z"
+# jira client -> the time zone of its user's profile
+_zones = weakref.WeakKeyDictionary()
+_zones_lock = threading.Lock()
+
+
+def fields_for(field_map):
+    """The issue fields needed to evaluate the jmespath sources of field_map
+
+    eg: {"assignee": "fields.assignee.displayName"} needs ["assignee"]
+    """
+    fields = []
+    for source in field_map.values():
+        path = source.split(".")
+        if path[0] == "fields" and len(path) > 1:
+            path = path[1:]
+        name = re.split(r"[^\w]", path[0])[0]
+        if name and name not in ISSUE_KEYS and name not in fields:
+            fields.append(name)
+    return fields
+
+
+def normalize_jql(jql):
+    """The cache key of a query, eg: "a  =  b ORDER BY updated DESC, ..."
+    and "a = b" are the same query. Other orders are kept, QueryCache
+    reads the sort fields from them.
+    """
+    jql = JQL_SPACE.sub(lambda match: match.group(1) or " ", jql).strip()
+    if jql.lower().endswith(DEFAULT_ORDER.lower()):
+        jql = jql[: -len(DEFAULT_ORDER)].rstrip()
+    return jql
+
+
+def _user_zone(jira):
+    with _zones_lock:
+        if jira not in _zones:
+            zone = None
+            try:
+                from zoneinfo import ZoneInfo
+
+                zone = ZoneInfo(jira.myself().get("timeZone") or "")
+            except (ImportError, ValueError, KeyError):
+                # unknown zone, the server's own offset is the best guess
+                pass
+            _zones[jira] = zone
+        return _zones[jira]
+
+
+def server_now(jira):
+    """jira's clock, in the time zone of the user's profile
+
+    jql reads dates in that zone, so sync watermarks are taken from here
+    rather than the local clock.
+    """
+    try:
+        now = datetime.strptime(jira.server_info()["serverTime"], JIRA_TIME)
+    except (KeyError, ValueError):
+        now = datetime.now().astimezone()
+    zone = _user_zone(jira)
+    return now.astimezone(zone) if zone else now
+
+
+def jql_since(moment):
+    """moment as a jql date for updated >= queries"""
+    # jql dates are minute resolution, overlap to not miss edits
+    return (moment - timedelta(minutes=1)).strftime(JQL_DATE)
+
+
+def search_defaults(config=None):
+    search = (config or get_config()).jira.get("search") or {}
+    return {
+        "page_size": search.get("page_size", 50),
+        "limit": search.get("limit", 50),
+        "workers": search.get("workers", 4),
+        "cache_ttl": search.get("cache_ttl", 120),
+        "cache_size": search.get("cache_size", 256),
+    }
+
+
+def split_search_options(line):
+    """Pull --limit/--page-size/--local/--output out of a raw jql line
+
+    Returns the remaining jql and a dict of the options found.
+    """
+    options = {}
+    for name, value in SEARCH_OPTION.findall(line):
+        options[name.replace("-", "_")] = int(value)
+    line = SEARCH_OPTION.sub("", line)
+    if LOCAL_OPTION.search(line):
+        options["local"] = True
+        line = LOCAL_OPTION.sub("", line)
+    output = OUTPUT_OPTION.search(line)
+    if output:
+        options["output"] = output.group(1)
+        line = OUTPUT_OPTION.sub("", line)
+    return line.strip(), options
+
+
+class SearchPages:
+    """Pages of issues for a jql query, yielded as each page arrives
+
+    Once the first page reports the total the remaining pages are
+    prefetched concurrently, they are still yielded in order. Jira cloud
+    pages with opaque tokens so there only the next page is prefetched.
+    With a QueryCache each page is read from it and stored in it.
+    """
+
+    def __init__(
+        self,
+        jira,
+        jql,
+        page_size=None,
+        limit=None,
+        workers=None,
+        cache=None,
+        config=None,
+        **kwargs,
+    ):
+        defaults = search_defaults(config)
+        self.jira = jira
+        self.jql = jql
+        self.page_size = page_size or defaults["page_size"]
+        self.limit = limit
+        self.workers = workers or defaults["workers"]
+        self.kwargs = kwargs
+        self.cache = cache
+        self.total = None
+        self.count = 0
+        # set when the limit cut the results short
+        self.truncated = False
+        if limit is not None:
+            self.page_size = min(self.page_size, limit)
+
+    def __iter__(self):
+        if getattr(self.jira, "_is_cloud", False):
+            pages = self._token_pages()
+        else:
+            pages = self._offset_pages()
+        for page in pages:
+            self.count += len(page)
+            yield page
+
+    def issues(self):
+        for page in self:
+            yield from page
+
+    def _cached(self, fetch, position, size):
+        if self.cache is None:
+            return fetch(position, size)
+        key = (
+            normalize_jql(self.jql),
+            tuple(
+                sorted(
+                    (name, repr(value)) for name, value in self.kwargs.items()
+                )
+            ),
+            position,
+            size,
+        )
+        page = self.cache.get(key)
+        if page is None:
+            page = fetch(position, size)
+            self.cache.set(key, page)
+        return page
+
+    def _fetch(self, start, size):
+        return self._cached(
+            lambda start, size: self.jira.search_issues(
+                self.jql, startAt=start, maxResults=size, **self.kwargs
+            ),
+            start,
+            size,
+        )
+
+    def _offset_pages(self):
+        first = self._fetch(0, self.page_size)
+        self.total = first.total
+        end = first.total
+        if self.limit is not None and self.limit < end:
+            end = self.limit
+            self.truncated = True
+        yield first[:end]
+        # the server may cap maxResults below what we asked for
+        step = len(first) or self.page_size
+        starts = range(len(first), end, step)
+        if not starts:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(
+                carry(
+                    lambda start: self._fetch(start, min(step, end - start))
+                ),
+                starts,
+            )
+
+    def _fetch_token(self, token, size):
+        return self._cached(
+            lambda token, size: self.jira.enhanced_search_issues(
+                self.jql, nextPageToken=token, maxResults=size, **self.kwargs
+            ),
+            token,
+            size,
+        )
+
+    def _token_pages(self):
+        seen = 0
+        fetch = carry(self._fetch_token)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(fetch, None, self.page_size)
+            while future:
+                page = future.result()
+                token = page.nextPageToken
+                if self.limit is not None:
+                    page = page[: self.limit - seen]
+                seen += len(page)
+                future = None
+                if token and (self.limit is None or seen < self.limit):
+                    future = pool.submit(fetch, token, self.page_size)
+                yield page
+        self.truncated = bool(token)
+        if not token:
+            self.total = seen
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+from astmgr.search import DEFAULT_ORDER, jql_since, normalize_jql, server_now
+from astmgr.utils import build_jira
+
+
+def test_server_now_is_in_the_user_zone(standin, config):
+    from zoneinfo import ZoneInfo
+
+    now = server_now(build_jira(config))
+    zone = ZoneInfo(standin.time_zone)
+    assert now.utcoffset() == datetime.now(zone).utcoffset()
+    assert abs(now - datetime.now(timezone.utc)) < timedelta(minutes=1)
+
+
+def test_jql_since_overlaps_a_minute():
+    moment = datetime(2024, 3, 1, 10, 0, 30)
+    assert jql_since(moment) == "2024/03/01 09:59"
+
+
+def test_normalize_jql_collapses_whitespace_outside_quotes():
+    assert (
+        normalize_jql('  summary ~ "two  spaces"   AND\n labels = x ')
+        == 'summary ~ "two  spaces" AND labels = x'
+    )
+
+
+def test_normalize_jql_strips_only_the_default_order():
+    assert normalize_jql("a = b") == "a = b"
+    assert normalize_jql("a  =  b" + DEFAULT_ORDER) == "a = b"
+    assert normalize_jql("a = b order by  UPDATED desc, created desc") == (
+        "a = b"
+    )
+    assert normalize_jql("a = b ORDER BY rank") == "a = b ORDER BY rank"
+    assert normalize_jql("a = b ORDER BY updated ASC") == (
+        "a = b ORDER BY updated ASC"
+    )
+
+
+def test_canned_searches_narrow_before_their_order(magics):
+    searched = []
+    magics._search = lambda line, options: searched.append((line, options))
+    magics.reportedbyme("project = BENCH --limit 5 -o json")
+    magics.recentlyviewed("")
+    magics.recentlyviewed("status = Open order by key")
+    assert searched == [
+        (
+            "reporter in (currentUser()) AND (project = BENCH) ORDER BY "
+            "updated DESC, created DESC, lastViewed DESC",
+            {"limit": 5, "output": "json"},
+        ),
+        ("ORDER BY lastViewed DESC", {}),
+        ("status = Open ORDER BY key", {}),
+    ]
@@ -1,21 +1,22 @@
-from docopt import docopt
-import os
-from os.path import expanduser, join, exists, basename
-from jira import JIRA, __version__
-import subprocess
-from IPython.terminal.prompts import Prompts, Token
+from importlib.metadata import version
+
+from IPython.terminal.embed import InteractiveShellEmbed
+
 from astmgr.magics import JiraMagics
 from astmgr.prompt import JiraPrompt
-import IPython
-from IPython.terminal.embed import InteractiveShellEmbed
-from astmgr import CONFIG
+from astmgr.stats import DEFAULT_STATS
+from astmgr.utils import get_config
 
 
 class AssistantManagerShell(InteractiveShellEmbed):
     def __init__(self, *args, **kwargs):
         kwargs["banner1"] = "AssistantManager Shell"
+        # before super().__init__, which builds self.prompts from it
+        kwargs.setdefault("prompts_class", JiraPrompt)
         super().__init__(*args, **kwargs)
-        self.prompts_class = JiraPrompt
+        settings = dict(DEFAULT_STATS, **get_config().get("stats", {}))
+        if settings["toolbar"] and getattr(self, "pt_app", None):
+            self.pt_app.bottom_toolbar = self.prompts.bottom_toolbar
 
     def init_magics(self):
         super().init_magics()
@@ -25,5 +26,5 @@ class AssistantManagerShell(InteractiveShellEmbed):
 def main():
     ip_shell = AssistantManagerShell()
     ip_shell(
-        f"*** jira client is in 'jira' version: {__version__} ({CONFIG.jira.api.server}). Press Ctrl-D to exit."
+        f"*** jira client is in 'jira' version: {version('jira')} ({get_config().jira.api.server}). Press Ctrl-D to exit."
     )
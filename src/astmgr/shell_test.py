@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import yaml
+from bench import write_config
+
+import astmgr
+
+SHELL = (
+    "from astmgr.shell import AssistantManagerShell; "
+    "shell = AssistantManagerShell(simple_prompt=False); "
+    "print(type(shell.prompts).__name__, "
+    "shell.pt_app.bottom_toolbar == shell.prompts.bottom_toolbar)"
+)
+
+
+def test_shell_with_the_stats_toolbar(standin, tmp_path):
+    path = write_config(str(tmp_path), standin.url)
+    with open(path) as fp:
+        config = yaml.safe_load(fp)
+    config["stats"] = {"toolbar": True}
+    with open(path, "w") as fp:
+        yaml.safe_dump(config, fp)
+    result = subprocess.run(
+        [sys.executable, "-c", SHELL],
+        capture_output=True,
+        text=True,
+        env=dict(
+            os.environ,
+            ASTMGR_CONFIG=path,
+            PYTHONPATH=os.path.dirname(os.path.dirname(astmgr.__file__)),
+        ),
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["JiraPrompt", "True"]
@@ -0,0 +1,104 @@
+import bisect
+import difflib
+import time
+
+from astmgr.utils import read_cache, write_cache
+
+SPRINT_CACHE = "sprints.json"
+
+
+class SprintRecord:
+    "The parts of a jira sprint we keep around and cache on disk"
+
+    __slots__ = ("id", "name", "state", "board_id")
+
+    def __init__(self, id, name, state, board_id=None):
+        self.id = id
+        self.name = name
+        self.state = state
+        self.board_id = board_id
+
+    @classmethod
+    def from_sprint(cls, sprint, board_id=None):
+        return cls(sprint.id, sprint.name, sprint.state, board_id)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "board_id": self.board_id,
+        }
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "<Sprint %s id:%s state:%s>" % (self.name, self.id, self.state)
+
+
+class SprintRegistry:
+    """The boards mapping plus indexes built once for O(1) sprint lookups"""
+
+    def __init__(self, boards):
+        self.boards = boards
+        self.by_name = {}
+        self.by_id = {}
+        self.by_state = {}
+        # the active sprint that isn't a QA sprint, what _current_sprint wants
+        self.current = None
+        for sprints in boards.values():
+            for name, sprint in sprints.items():
+                self.by_name.setdefault(name, sprint)
+                self.by_id[sprint.id] = sprint
+                state = sprint.state.lower()
+                self.by_state.setdefault(state, []).append(sprint)
+                if (
+                    self.current is None
+                    and state == "active"
+                    and "qa" not in name.lower()
+                ):
+                    self.current = sprint
+        self.names = sorted(self.by_name)
+
+    def fuzzy(self, name, n=5):
+        return difflib.get_close_matches(name, self.names, n=n, cutoff=0.5)
+
+    def complete(self, prefix):
+        """Sprint names starting with prefix, or close matches if none do"""
+        start = bisect.bisect_left(self.names, prefix)
+        matches = []
+        for name in self.names[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+        return matches or self.fuzzy(prefix)
+
+
+def load_cache(ttl, config=None):
+    """Return the cached boards mapping, or None if missing or older than ttl"""
+    data = read_cache(SPRINT_CACHE, config)
+    if not data or time.time() - data.get("fetched", 0) > ttl:
+        return None
+    boards = {}
+    for board in data["boards"]:
+        boards[(board["name"], board["id"])] = {
+            sprint["name"]: SprintRecord(**sprint)
+            for sprint in board["sprints"]
+        }
+    return boards
+
+
+def save_cache(boards, config=None):
+    data = {
+        "fetched": time.time(),
+        "boards": [
+            {
+                "name": name,
+                "id": board_id,
+                "sprints": [sprint.to_dict() for sprint in sprints.values()],
+            }
+            for (name, board_id), sprints in boards.items()
+        ],
+    }
+    write_cache(SPRINT_CACHE, data, config)
@@ -0,0 +1,55 @@
+import os
+import re
+import subprocess
+import sys
+
+import astmgr
+
+# dependencies only the magics that use them may import
+HEAVY = (
+    "jira",
+    "gitlab",
+    "requests",
+    "yaml",
+    "tabulate",
+    "jmespath",
+    "docopt",
+)
+# IPython is imported first so only astmgr's own import cost is measured
+IMPORT = "import IPython.terminal.embed; import astmgr.shell; import sys; "
+
+
+def _python(code):
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.path.dirname(os.path.dirname(astmgr.__file__)),
+    )
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def test_heavy_imports_are_lazy():
+    result = _python(
+        IMPORT
+        + "print(' '.join(sorted(set(%r) & set(sys.modules))))" % (HEAVY,)
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_import_time_budget():
+    budget = float(os.environ.get("ASTMGR_IMPORT_BUDGET_MS", 150))
+    result = _python(IMPORT)
+    timings = re.findall(
+        r"import time:\s+\d+ \|\s+(\d+) \| astmgr.shell$",
+        result.stderr,
+        re.MULTILINE,
+    )
+    assert timings, result.stderr
+    elapsed = int(timings[-1]) / 1000
+    print("astmgr.shell imported in %.1fms" % elapsed)
+    assert elapsed < budget
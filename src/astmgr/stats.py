@@ -0,0 +1,224 @@
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import Counter, deque
+
+# history: invocations kept for %astmgr_stats, older ones are dropped
+# toolbar: show the last one below the prompt
+DEFAULT_STATS = {"history": 500, "toolbar": False}
+# phases in the order %astmgr_stats shows them
+PHASES = ["network", "parse", "project", "yaml", "highlight"]
+
+_history = deque(maxlen=DEFAULT_STATS["history"])
+# the magic running in this context, worker pools get it through carry()
+_current = contextvars.ContextVar("astmgr_invocation", default=None)
+_lock = threading.Lock()
+
+
+class Invocation:
+    """Timings, requests and bytes of one magic call
+
+    Requests and phases count from the magic's thread and the worker
+    pools it carries its context into, network time is summed over them.
+    Background threads eg: prefetch or %watch polls count towards nothing.
+    """
+
+    def __init__(self, magic, line):
+        self.magic = magic
+        self.line = line
+        self.started = time.time()
+        self.wall = None
+        self.error = None
+        self.requests = Counter()
+        self.bytes = Counter()
+        self.phases = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] += seconds
+
+    def request(self, service, nbytes, seconds):
+        with self.lock:
+            self.requests[service] += 1
+            self.bytes[service] += nbytes
+            self.phases["network"] += seconds
+
+    def record(self):
+        with self.lock:
+            return {
+                "magic": self.magic,
+                "line": self.line,
+                "started": self.started,
+                "wall": round(self.wall or 0, 4),
+                "error": self.error,
+                "requests": dict(self.requests),
+                "bytes": dict(self.bytes),
+                "phases": {
+                    phase: round(seconds, 4)
+                    for phase, seconds in self.phases.items()
+                },
+            }
+
+
+def set_history(size):
+    global _history
+    with _lock:
+        _history = deque(_history, maxlen=size)
+
+
+def instrumented(function):
+    """
+    A decorator recording every call of a line magic, see %astmgr_stats
+
+    A magic called from another magic counts towards the outer call.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _current.get() is not None:
+            return function(*args, **kwargs)
+        line = args[1] if len(args) > 1 else kwargs.get("line", "")
+        invocation = Invocation(function.__name__, line)
+        token = _current.set(invocation)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except BaseException as e:
+            invocation.error = repr(e)
+            raise
+        finally:
+            invocation.wall = time.perf_counter() - start
+            _current.reset(token)
+            with _lock:
+                _history.append(invocation)
+
+    return wrapper
+
+
+def carry(function):
+    """function, run in a copy of the caller's context
+
+    For the worker pools of a magic, so their requests count towards it.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # a context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a block into the running magic's phase name"""
+    invocation = _current.get()
+    if invocation is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add(name, time.perf_counter() - start)
+
+
+def observe(service, response, seconds, stream=False):
+    """Count a response of service against the running magic
+
+    Its body is read here unless streamed so network time includes the
+    download, and its json() is timed as the parse phase.
+    """
+    invocation = _current.get()
+    if invocation is None:
+        return
+    if stream:
+        nbytes = int(response.headers.get("Content-Length") or 0)
+    else:
+        start = time.perf_counter()
+        nbytes = len(response.content)
+        seconds += time.perf_counter() - start
+    invocation.request(service, nbytes, seconds)
+    decode = response.json
+
+    def timed_json(**kwargs):
+        with phase("parse"):
+            return decode(**kwargs)
+
+    response.json = timed_json
+
+
+def records(magic=None):
+    with _lock:
+        invocations = list(_history)
+    return [
+        invocation.record()
+        for invocation in invocations
+        if magic is None or invocation.magic == magic
+    ]
+
+
+def totals(records):
+    """Per magic calls, wall time and requests of records"""
+    magics = {}
+    for record in records:
+        total = magics.setdefault(
+            record["magic"],
+            {
+                "magic": record["magic"],
+                "calls": 0,
+                "wall": 0.0,
+                "max_wall": 0.0,
+                "requests": 0,
+                "KB": 0,
+                "network": 0.0,
+            },
+        )
+        total["calls"] += 1
+        total["wall"] += record["wall"]
+        total["max_wall"] = max(total["max_wall"], record["wall"])
+        total["requests"] += sum(record["requests"].values())
+        total["KB"] += sum(record["bytes"].values()) // 1024
+        total["network"] += record["phases"].get("network", 0)
+    for total in magics.values():
+        total["mean_wall"] = round(total.pop("wall") / total["calls"], 4)
+        total["network"] = round(total["network"], 4)
+    return sorted(magics.values(), key=lambda total: -total["mean_wall"])
+
+
+def reset():
+    with _lock:
+        _history.clear()
+
+
+def summary():
+    """One line about the last magic, for the prompt toolbar"""
+    with _lock:
+        if not _history:
+            return ""
+        record = _history[-1].record()
+    parts = ["%s %.2fs" % (record["magic"], record["wall"])]
+    for service, count in sorted(record["requests"].items()):
+        parts.append(
+            "%s %s req %s KB"
+            % (service, count, record["bytes"].get(service, 0) // 1024)
+        )
+    parts.extend(
+        "%s %.2fs" % (name, record["phases"][name])
+        for name in PHASES
+        if record["phases"].get(name)
+    )
+    return " | ".join(parts)
+
+
+def export(path, magic=None):
+    """Append the recorded invocations to path as json lines"""
+    rows = records(magic)
+    with open(path, "a") as fp:
+        fp.writelines(json.dumps(row) + "\n" for row in rows)
+    return len(rows)
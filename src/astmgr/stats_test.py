@@ -0,0 +1,39 @@
+import threading
+
+from astmgr import stats
+from astmgr.batch import run_batch
+from astmgr.stats import instrumented
+from astmgr.utils import build_jira
+
+
+class Worker:
+    def __init__(self, jira):
+        self.jira = jira
+
+    @instrumented
+    def work(self, line=""):
+        # a thread of its own, like a prefetch or a %watch poll
+        thread = threading.Thread(target=self.jira.myself)
+        thread.start()
+        thread.join()
+        run_batch(self.jira.issue, ["BENCH-1", "BENCH-2"])
+
+
+def test_background_threads_are_not_counted(config):
+    Worker(build_jira(config)).work()
+    assert stats.records("work")[-1]["requests"] == {"jira": 2}
+
+
+def test_search_pages_count_towards_the_magic(standin, magics):
+    standin.reset()
+    magics.search("project = BENCH --limit 120 --page-size 40")
+    assert stats.records("search")[-1]["requests"] == {
+        "jira": standin.requests()
+    }
+
+
+def test_show_counts_its_concurrent_fetches(standin, magics):
+    standin.reset()
+    magics.show("BENCH-1 BENCH-2")
+    assert stats.records("show")[-1]["requests"] == {"jira": 2}
+    assert standin.requests() == 2
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from astmgr.stats import carry
+
+DEFAULT_TRANSPORT = {"pool_size": 20, "timeout": 30, "retries": 3}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def transport_settings(config):
+    """pool_size, timeout and retries from a transport config section"""
+    return dict(DEFAULT_TRANSPORT, **(config or {}))
+
+
+def tune_session(session, scheduler, pool_size, retries, **kwargs):
+    """Mount a keep-alive adapter big enough for our concurrent fan outs
+
+    Every request waits on the scheduler, which also retries throttled
+    responses. Otherwise only connection failures are retried here, the
+    jira and gitlab clients are built not to retry at all.
+    """
+    from urllib3.util.retry import Retry
+
+    from astmgr.adapter import ScheduledAdapter
+
+    adapter = ScheduledAdapter(
+        scheduler,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            redirect=5,
+            # throttled responses are the scheduler's job
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def executor(workers=DEFAULT_TRANSPORT["pool_size"]):
+    """The thread pool async calls run on, sized to the connection pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="astmgr-transport"
+            )
+    return _executor
+
+
+async def call_async(function, *args, **kwargs):
+    """Await a blocking call, run on the shared pool"""
+    loop = asyncio.get_running_loop()
+    # in the caller's context, so the requests count towards its magic
+    return await loop.run_in_executor(
+        executor(), functools.partial(carry(function), *args, **kwargs)
+    )
+
+
+async def gather(*coroutines):
+    """asyncio.gather as a coroutine, so it can be handed to run()"""
+    return await asyncio.gather(*coroutines)
+
+
+def run(coroutine):
+    """Run a coroutine to completion from blocking code eg: a line magic"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # a loop is already running in this thread (IPython autoawait)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(carry(asyncio.run), coroutine).result()
+
+
+class AsyncJira:
+    """Awaitable versions of the methods of a blocking client
+
+    eg: await asyncio.gather(ajira.issue("A-1"), ajira.comments("A-1"))
+    """
+
+    def __init__(self, get_client):
+        self._get_client = get_client
+
+    def __getattr__(self, name):
+        attr = getattr(self._get_client(), name)
+        if not callable(attr):
+            return attr
+        return functools.partial(call_async, attr)
@@ -0,0 +1,35 @@
+import pytest
+
+from astmgr.scheduler import get_scheduler
+from astmgr.utils import build_gitlab, build_jira
+
+
+def _attempts(standin):
+    return sum(
+        count
+        for route, count in standin.counts.items()
+        if route.endswith("/throttled$")
+    )
+
+
+def test_jira_throttle_is_only_retried_by_the_scheduler(standin, config):
+    from jira.exceptions import JIRAError
+
+    # the default, the adapter retries connection errors only
+    config.transport.retries = 3
+    jira = build_jira(config)
+    standin.reset()
+    with pytest.raises(JIRAError):
+        jira._get_json("throttled")
+    assert _attempts(standin) == get_scheduler("jira").retries + 1
+
+
+def test_gitlab_throttle_is_only_retried_by_the_scheduler(standin, config):
+    from gitlab.exceptions import GitlabHttpError
+
+    config.transport.retries = 3
+    gitlab = build_gitlab(config)
+    standin.reset()
+    with pytest.raises(GitlabHttpError):
+        gitlab.http_get("/projects/1/throttled")
+    assert _attempts(standin) == get_scheduler("gitlab").retries + 1
@@ -0,0 +1,153 @@
+import re
+import shlex
+import threading
+
+# magic name -> Usage, filled in by the usage decorator as magics are defined
+USAGES = {}
+OPTION_ARGUMENT = re.compile(r"(--[\w-]+)[= ](<[\w-]+>)")
+POSITIONAL = re.compile(r"(?<![=\w])<[\w-]+>")
+
+
+class Usage:
+    """A docopt usage, compiled once and matched against each magic line
+
+    docopt re-parses the usage on every call, here parse() only tokenizes
+    the line and matches it. doc may be a callable returning the usage so
+    magics whose usage depends on the config don't read it at import.
+    """
+
+    def __init__(self, doc):
+        self._doc = doc
+        self._lock = threading.Lock()
+        self._compiled = False
+
+    def _compile(self):
+        from docopt import (
+            AnyOptions,
+            Option,
+            formal_usage,
+            parse_defaults,
+            parse_pattern,
+            printable_usage,
+        )
+
+        doc = self._doc() if callable(self._doc) else self._doc
+        usage = printable_usage(doc)
+        options = parse_defaults(doc)
+        pattern = parse_pattern(formal_usage(usage), options)
+        pattern_options = set(pattern.flat(Option))
+        for any_options in pattern.flat(AnyOptions):
+            any_options.children = list(set(options) - pattern_options)
+        self.doc = doc
+        self.usage = usage
+        self.options = options
+        self.pattern = pattern.fix()
+        self.defaults = self.pattern.flat()
+        # what completion needs: option names, what each option takes and
+        # the positional arguments of every usage line in order
+        self.option_names = sorted(
+            name
+            for option in options
+            for name in (option.short, option.long)
+            if name
+        )
+        self.option_arguments = dict(OPTION_ARGUMENT.findall(doc))
+        for option in options:
+            if option.short and option.long in self.option_arguments:
+                self.option_arguments[option.short] = self.option_arguments[
+                    option.long
+                ]
+        self.positionals = [
+            POSITIONAL.findall(OPTION_ARGUMENT.sub("", line))
+            for line in usage.splitlines()[1:]
+        ]
+        self._compiled = True
+
+    def compile(self):
+        if not self._compiled:
+            with self._lock:
+                if not self._compiled:
+                    self._compile()
+        return self
+
+    def parse(self, line):
+        """docopt(doc, argv=shlex.split(line)) without the reparse"""
+        from docopt import DocoptExit, Dict, TokenStream, parse_argv
+
+        self.compile()
+        argv = parse_argv(
+            TokenStream(shlex.split(line or ""), DocoptExit),
+            list(self.options),
+        )
+        if any(
+            option.name in ("-h", "--help") and option.value for option in argv
+        ):
+            print(self.doc.strip("\n"))
+            raise SystemExit()
+        matched, left, collected = self.pattern.match(argv)
+        if not matched or left:
+            DocoptExit.usage = self.usage
+            raise DocoptExit()
+        return Dict(
+            (
+                leaf.name,
+                (
+                    list(leaf.value)
+                    if isinstance(leaf.value, list)
+                    else leaf.value
+                ),
+            )
+            for leaf in self.defaults + collected
+        )
+
+    def argument(self, option):
+        """The <argument> an option takes, eg: --assignee takes <assignee>"""
+        self.compile()
+        return self.option_arguments.get(option)
+
+    def expects(self, words):
+        """The argument names that could follow words, eg: ["<nick>"]
+
+        For an option taking a value that is its <argument>, otherwise the
+        positional arguments at this position of any usage line.
+        """
+        self.compile()
+        if words and words[-1] in self.option_arguments:
+            return [self.option_arguments[words[-1]]]
+        position = 0
+        skip = False
+        for word in words:
+            if skip:
+                skip = False
+            elif word.startswith("-"):
+                skip = "=" not in word and word in self.option_arguments
+            else:
+                position += 1
+        return [
+            positionals[position]
+            for positionals in self.positionals
+            if position < len(positionals)
+        ]
+
+    def complete(self, prefix):
+        """Option names starting with prefix"""
+        self.compile()
+        return [name for name in self.option_names if name.startswith(prefix)]
+
+
+def usage(doc):
+    """Attach a compiled docopt usage to a magic, see parse_usage
+
+    Like IPython's magic_arguments, the usage travels with the function and
+    is registered in USAGES under the magic's name for completion.
+    """
+
+    def decorator(function):
+        function.usage = USAGES[function.__name__] = Usage(doc)
+        return function
+
+    return decorator
+
+
+def parse_usage(magic_func, line):
+    return magic_func.usage.parse(line)
@@ -1,11 +1,18 @@
+import contextlib
+import functools
+import json
+import logging
+import os
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from box import Box
-from jira import JIRA
-from gitlab import Gitlab
+from astmgr.scheduler import get_scheduler
+from astmgr.transport import transport_settings, tune_session
 
-
-DEFAULT_SETTINGS_YML = "./astmgr.yaml"
+DEFAULT_SETTINGS_YML = os.environ.get("ASTMGR_CONFIG", "./astmgr.yaml")
+DEFAULT_CACHE_DIR = "~/.cache/astmgr"
 
 
 def passstore(path):
@@ -16,22 +23,182 @@ def pass_get(path):
     return passstore(path.split("pass:/")[-1])
 
 
-def get_jira():
-    config = Box.from_yaml(filename=DEFAULT_SETTINGS_YML)
-    return JIRA(
+class Lazy:
+    "A value built by factory on first use, or warmed up in a thread"
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._built = False
+        self._value = None
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value
+
+    @property
+    def built(self):
+        return self._built
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._built = True
+
+    def _warm(self):
+        try:
+            self.get()
+        except Exception:
+            # get() retries on the next foreground use and raises there
+            logging.exception("error warming %s" % self._factory)
+
+    def warm(self):
+        thread = threading.Thread(target=self._warm, daemon=True)
+        thread.start()
+        return thread
+
+
+def _load_config():
+    from box import Box
+
+    return Box.from_yaml(filename=DEFAULT_SETTINGS_YML)
+
+
+_config = Lazy(_load_config)
+# resolved pass:// secrets, kept in process memory only
+_secrets = {}
+_secrets_lock = threading.Lock()
+
+
+def get_config():
+    return _config.get()
+
+
+def _pass_refs(node):
+    if isinstance(node, dict):
+        for value in node.values():
+            yield from _pass_refs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _pass_refs(value)
+    elif isinstance(node, str) and node.startswith("pass:/"):
+        yield node
+
+
+def resolve_secrets(config=None):
+    """Resolve every pass:// reference in the config in one parallel batch"""
+    with _secrets_lock:
+        refs = set(_pass_refs(config or get_config())) - set(_secrets)
+        if refs:
+            with ThreadPoolExecutor(max_workers=len(refs)) as pool:
+                _secrets.update(zip(refs, pool.map(pass_get, refs)))
+    return _secrets
+
+
+def secret(value, config=None):
+    """Return value, resolved through pass if it is a pass:// reference"""
+    if not value.startswith("pass:/"):
+        return value
+    if value not in _secrets:
+        resolve_secrets(config)
+    if value not in _secrets:
+        with _secrets_lock:
+            _secrets[value] = pass_get(value)
+    return _secrets[value]
+
+
+def build_jira(config):
+    """A jira client for config, its requests go through the scheduler"""
+    from jira import JIRA
+
+    transport = transport_settings(config.get("transport"))
+    jira = JIRA(
         options=dict(server=config.jira.api.server, verify=True),
         basic_auth=(
-            pass_get(config.jira.api.username),
-            pass_get(config.jira.api.password),
+            secret(config.jira.api.username, config),
+            secret(config.jira.api.password, config),
         ),
+        timeout=transport["timeout"],
+        # the scheduler retries throttles, connection errors are retried by
+        # the adapter, the client itself must not retry on top of them
+        max_retries=0,
     )
+    tune_session(
+        jira._session,
+        get_scheduler("jira", config.jira.get("rate_limit")),
+        **transport,
+    )
+    return jira
 
 
-def get_config():
-    return Box.from_yaml(filename=DEFAULT_SETTINGS_YML)
+def build_gitlab(config):
+    from gitlab import Gitlab
+
+    transport = transport_settings(config.get("transport"))
+    gitlab = Gitlab(
+        url=config.gitlab.api.get("url"),
+        private_token=secret(config.gitlab.api.personal_access_token, config),
+        timeout=transport["timeout"],
+    )
+    # python-gitlab takes these per request, it would sleep and retry a 429
+    # up to 10 times on top of the scheduler
+    gitlab.http_request = functools.partial(
+        gitlab.http_request, obey_rate_limit=False, max_retries=0
+    )
+    tune_session(
+        gitlab.session,
+        get_scheduler("gitlab", config.gitlab.get("rate_limit")),
+        **transport,
+    )
+    return gitlab
+
+
+_jira = Lazy(lambda: build_jira(get_config()))
+_gitlab = Lazy(lambda: build_gitlab(get_config()))
+
+
+def get_jira():
+    return _jira.get()
 
 
 def get_gitlab():
-    return Gitlab(
-        private_token=pass_get(get_config().gitlab.api.personal_access_token)
-    )
+    return _gitlab.get()
+
+
+def cache_path(name, config=None):
+    """name in the cache dir of config, the global config by default"""
+    if config is None:
+        config = get_config()
+    cache = config.get("cache") or {}
+    path = os.path.expanduser(cache.get("dir", DEFAULT_CACHE_DIR))
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, name)
+
+
+def read_cache(name, config=None):
+    """The json in a cache file, {} when missing or unreadable"""
+    try:
+        with open(cache_path(name, config)) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(name, data, config=None):
+    path = cache_path(name, config)
+    # write to a temp file and rename so a crash never leaves a torn file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp, path)
+    except OSError:
+        logging.warning(f"error writing {path}")
+    finally:
+        # gone once replaced, left behind by any failure before
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
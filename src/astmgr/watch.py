@@ -0,0 +1,220 @@
+import logging
+import re
+import threading
+from datetime import datetime
+
+from astmgr.search import SearchPages, jql_since, server_now
+
+WATCH_FIELDS = ["summary", "status", "customfield_10020", "updated"]
+# snapshots larger than this aren't checked for issues leaving the query,
+# the key in (...) clause would get too long
+MAX_LEFT_KEYS = 500
+ORDER_BY = re.compile(r"\border\s+by\b", re.I)
+# jira's error for a key in (...) naming an issue that's gone
+UNKNOWN_KEY = re.compile(r"key '([^']+)' does not exist", re.I)
+
+
+class CapturedQuery(Exception):
+    "Raised by JiraMagics._pages while %watch is capturing a magic's query"
+
+
+def _row(issue):
+    fields = issue.raw["fields"]
+    return {
+        "summary": fields.get("summary"),
+        "status": (fields.get("status") or {}).get("name"),
+        "sprints": ",".join(
+            sprint["name"]
+            for sprint in fields.get("customfield_10020") or []
+            if isinstance(sprint, dict)
+        ),
+        "updated": fields.get("updated"),
+    }
+
+
+class Watch:
+    """Poll a query for issues updated since the last tick
+
+    A snapshot of the matching issues is kept in memory, each tick reports
+    the issues that are new to it, moved sprint, changed status, no longer
+    match or were removed. A query cut to limit issues is rerun in full each tick,
+    others only fetch the issues updated since the last. The interval
+    halves after a tick with changes and grows by half after a quiet one,
+    between shortest and longest seconds.
+    """
+
+    def __init__(
+        self,
+        jira,
+        jql,
+        report,
+        interval,
+        shortest,
+        longest,
+        limit=None,
+        config=None,
+    ):
+        self.jira = jira
+        self.config = config
+        # set by %watch, for --list and the printed changes
+        self.id = None
+        self.line = jql
+        where = ORDER_BY.split(jql, 1)
+        self.where = where[0].strip()
+        # the listing's own order picks the snapshot when limit cuts it
+        self.order = jql[len(where[0]) :].strip() or "ORDER BY updated ASC"
+        self.report = report
+        self.interval = interval
+        self.shortest = shortest
+        self.longest = longest
+        self.limit = limit
+        self.snapshot = {}
+        self.since = None
+        self.ticks = 0
+        self.changes = 0
+        self.polled = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, daemon=True, name="astmgr-watch"
+        )
+
+    def _search(self, jql, order="ORDER BY updated ASC", limit=None):
+        return SearchPages(
+            self.jira,
+            "%s %s" % (jql, order),
+            limit=limit,
+            config=self.config,
+            fields=WATCH_FIELDS,
+        ).issues()
+
+    def _fetch(self):
+        return {
+            issue.key: _row(issue)
+            for issue in self._search(self.where, self.order, self.limit)
+        }
+
+    def load(self):
+        if not self.limit:
+            # only polls of updated issues need a watermark
+            self.since = jql_since(server_now(self.jira))
+        self.snapshot = self._fetch()
+        self.polled = datetime.now()
+
+    def _change(self, key, row, before):
+        if before is None:
+            return ("new", key, row, None)
+        if row["status"] != before["status"]:
+            return ("status", key, row, before)
+        if row["sprints"] != before["sprints"]:
+            return ("moved", key, row, before)
+        return None
+
+    def _poll_limited(self):
+        # the top limit issues shift as others are edited, only a rerun of
+        # the ordered query tells which of them are in it now
+        snapshot = self._fetch()
+        changes = [
+            self._change(key, row, self.snapshot.get(key))
+            for key, row in snapshot.items()
+        ]
+        changes += [
+            ("left", key, before, before)
+            for key, before in self.snapshot.items()
+            if key not in snapshot
+        ]
+        self.snapshot = snapshot
+        return [change for change in changes if change]
+
+    def _poll_updated(self):
+        changes = []
+        seen = set()
+        for issue in self._search(
+            '(%s) AND updated >= "%s"' % (self.where, self.since)
+        ):
+            row = _row(issue)
+            before = self.snapshot.get(issue.key)
+            seen.add(issue.key)
+            if before and row["updated"] == before["updated"]:
+                # seen last tick, the window overlaps
+                continue
+            changes.append(self._change(issue.key, row, before))
+            self.snapshot[issue.key] = row
+        gone = [key for key in self.snapshot if key not in seen]
+        if gone and len(gone) <= MAX_LEFT_KEYS:
+            changes.extend(self._left(gone))
+        return [change for change in changes if change]
+
+    def _left(self, gone):
+        """Changes for the issues of gone that no longer match"""
+        from jira.exceptions import JIRAError
+
+        changes = []
+        while gone:
+            try:
+                issues = list(
+                    self._search(
+                        'key in (%s) AND updated >= "%s" AND NOT (%s)'
+                        % (", ".join(gone), self.since, self.where)
+                    )
+                )
+            except JIRAError as e:
+                # jira refuses the whole query when one key was deleted
+                # or moved out of reach, drop those and ask again
+                unknown = set(UNKNOWN_KEY.findall(e.text or "")) & set(gone)
+                if e.status_code != 400 or not unknown:
+                    raise
+                for key in sorted(unknown):
+                    before = self.snapshot.pop(key)
+                    changes.append(("removed", key, before, before))
+                gone = [key for key in gone if key not in unknown]
+                continue
+            for issue in issues:
+                before = self.snapshot.pop(issue.key, None)
+                changes.append(("left", issue.key, _row(issue), before))
+            break
+        return changes
+
+    def poll(self):
+        """Update the snapshot, returns (change, key, row, before) tuples"""
+        if self.limit:
+            changes = self._poll_limited()
+        else:
+            start = server_now(self.jira)
+            changes = self._poll_updated()
+            self.since = jql_since(start)
+        self.polled = datetime.now()
+        self.ticks += 1
+        self.changes += len(changes)
+        return changes
+
+    def adapt(self, changed):
+        if changed:
+            self.interval = max(self.shortest, self.interval / 2)
+        else:
+            self.interval = min(self.longest, self.interval * 1.5)
+
+    def run(self):
+        try:
+            self.load()
+        except Exception:
+            logging.exception(f"error loading watch on {self.where}")
+            return
+        while not self.stopped.wait(self.interval):
+            try:
+                changes = self.poll()
+            except Exception:
+                logging.warning(
+                    f"error polling watch on {self.where}", exc_info=True
+                )
+                self.interval = min(self.longest, self.interval * 2)
+                continue
+            if changes:
+                self.report(self, changes)
+            self.adapt(bool(changes))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,58 @@
+from astmgr.utils import build_jira
+from astmgr.watch import Watch
+
+
+def _watch(config, jql, limit=None):
+    return Watch(build_jira(config), jql, None, 30, 10, 300, limit, config)
+
+
+def test_limited_poll_reports_no_issues_outside_the_snapshot(config):
+    watch = _watch(config, "project = BENCH ORDER BY key", limit=10)
+    watch.load()
+    assert len(watch.snapshot) == 10
+    assert watch.poll() == []
+    assert len(watch.snapshot) == 10
+
+
+def test_limited_poll_reports_issues_leaving_the_top(standin, config):
+    watch = _watch(config, "project = BENCH ORDER BY key", limit=10)
+    watch.load()
+    standin.issues = 5
+    changes = watch.poll()
+    assert sorted(key for change, key, row, before in changes) == [
+        "BENCH-%s" % number for number in range(5, 10)
+    ]
+    assert {change for change, key, row, before in changes} == {"left"}
+
+
+def test_unlimited_poll_skips_issues_seen_last_tick(standin, config):
+    watch = _watch(config, "project = BENCH")
+    watch.load()
+    assert watch.since
+    assert watch.poll() == []
+    assert len(watch.snapshot) == standin.issues
+
+
+def test_watch_refuses_unfiltered_queries(magics, capsys):
+    magics.watch("search ORDER BY lastViewed DESC")
+    assert "has no filter" in capsys.readouterr().out
+    assert magics.watches == {}
+
+
+def test_watch_stop_takes_an_id(magics, capsys):
+    magics.watch("--stop=abc")
+    assert "watch id or all" in capsys.readouterr().out
+
+
+def test_unlimited_poll_reports_deleted_issues(standin, config):
+    watch = _watch(config, "project = BENCH")
+    watch.load()
+    standin.deleted = {"BENCH-3", "BENCH-7"}
+    changes = watch.poll()
+    assert sorted((change, key) for change, key, row, before in changes) == [
+        ("removed", "BENCH-3"),
+        ("removed", "BENCH-7"),
+    ]
+    assert "BENCH-3" not in watch.snapshot
+    # the snapshot no longer names them, later polls go through
+    assert watch.poll() == []